@@ -0,0 +1,135 @@
+"""
+Runs every project in a directory and checks its output against a golden file, on all cores.
+
+Each ``name.pyb`` needs a ``name.out`` next to it with the expected output; a ``name.in`` is used as
+the program's input if there is one.
+
+Usage::
+
+    python batch.py tests/ -j 8 --max-time 10
+
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from blockly import Environment
+from project import load_project
+from scheduler import Scheduler
+from quota import Quota, QuotaExceeded
+
+SLICE = 0.05
+
+class BatchResult:
+    def __init__(self, name: str, passed: bool, time: float, steps: int, message: str = ""):
+        self.name = name
+        self.passed = passed
+        self.time = time
+        self.steps = steps
+        self.message = message
+
+    def __repr__(self):
+        return f"BatchResult({self.name!r}, passed={self.passed}, time={self.time:.3f}, steps={self.steps})"
+
+def find_programs(directory: str) -> list[str]:
+    """
+    Paths of the projects in ``directory`` without their extension, sorted.
+    """
+    return sorted(os.path.join(directory, name[:-4]) for name in os.listdir(directory) if name.endswith(".pyb"))
+
+def read_fixture(path: str) -> str | None:
+    if not os.path.exists(path):
+        return None
+    with open(path, newline="") as file:
+        return file.read()
+
+def first_difference(expected: str, actual: str) -> str:
+    expected_lines, actual_lines = expected.split("\n"), actual.split("\n")
+    for i, (want, got) in enumerate(zip(expected_lines, actual_lines)):
+        if want != got:
+            return f"line {i + 1}: expected {want!r}, got {got!r}"
+    if len(expected_lines) > len(actual_lines):
+        return f"line {len(actual_lines) + 1}: expected {expected_lines[len(actual_lines)]!r}, got the end of the output"
+    return f"line {len(expected_lines) + 1}: expected the end of the output, got {actual_lines[len(expected_lines)]!r}"
+
+def run_program(base: str, quota: Quota | None = None) -> BatchResult:
+    """
+    Runs ``base.pyb`` and compares what it printed with ``base.out``. Never raises: every problem is a failed result.
+    """
+    name = os.path.basename(base)
+    start = time.perf_counter()
+    expected = read_fixture(base + ".out")
+    if expected is None:
+        return BatchResult(name, False, 0, 0, "no .out file")
+
+    environment = Environment()
+    stdin = read_fixture(base + ".in")
+    if stdin is not None:
+        environment.feed_input(stdin)
+    environment.close_input()
+
+    scheduler = None
+    try:
+        stacks, _ = load_project(base + ".pyb")
+        scheduler = Scheduler(stacks, environment, quota)
+        while not scheduler.finished():
+            scheduler.run(SLICE)
+            if not scheduler.runnable and (wake_time := scheduler.next_wake()) is not None:
+                time.sleep(max(wake_time - time.perf_counter(), 0))
+    except RuntimeError:
+        pass  # quit
+    except QuotaExceeded as e:
+        return BatchResult(name, False, time.perf_counter() - start, scheduler.steps, str(e))
+    except Exception as e:
+        if scheduler is None:
+            return BatchResult(name, False, time.perf_counter() - start, 0, f"couldn't load the project: {e}")
+        environment.output.append(f"Program encountered an error.\n{e}")
+
+    elapsed = time.perf_counter() - start
+    actual = "\n".join(environment.output)
+    expected = expected.removesuffix("\n")
+    if actual == expected:
+        return BatchResult(name, True, elapsed, scheduler.steps)
+    return BatchResult(name, False, elapsed, scheduler.steps, first_difference(expected, actual))
+
+def run_batch(directory: str, jobs: int | None = None, quota: Quota | None = None) -> list[BatchResult]:
+    """
+    Runs every program of ``directory`` in a pool of ``jobs`` processes (one per core by default).
+    Programs are handed out in chunks, so thousands of small ones don't wait on the pool.
+    """
+    programs = find_programs(directory)
+    jobs = jobs or os.cpu_count() or 1
+    if jobs == 1:
+        return [run_program(base, quota) for base in programs]
+
+    chunk_size = max(1, len(programs) // (jobs * 8))
+    with ProcessPoolExecutor(jobs) as pool:
+        return list(pool.map(run_program, programs, [quota] * len(programs), chunksize=chunk_size))
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a directory of PyBlocks projects and compare their output with .out files.")
+    parser.add_argument("directory", help="directory with .pyb, .out and optional .in files")
+    parser.add_argument("-j", "--jobs", type=int, help="processes to use (default: one per core)")
+    parser.add_argument("-q", "--quiet", action="store_true", help="only list the programs that failed")
+    parser.add_argument("--max-steps", type=int, help="fail a program after this many steps")
+    parser.add_argument("--max-time", type=float, help="fail a program after this many seconds")
+    parser.add_argument("--max-output", type=int, help="fail a program after it printed this many lines")
+    parser.add_argument("--max-memory", type=int, help="fail a program once its variables take roughly this many bytes")
+    args = parser.parse_args()
+    quota = Quota(args.max_steps, args.max_time, args.max_output, args.max_memory)
+
+    start = time.perf_counter()
+    results = run_batch(args.directory, args.jobs, quota)
+    for result in results:
+        if not result.passed or not args.quiet:
+            status = "PASS" if result.passed else "FAIL"
+            print(f"{status} {result.name}  {result.time:.3f}s  {result.steps} steps" + (f"  {result.message}" if result.message else ""))
+
+    failed = sum(not result.passed for result in results)
+    print(f"{len(results) - failed} passed, {failed} failed in {time.perf_counter() - start:.2f}s", file=sys.stderr)
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
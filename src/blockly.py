@@ -1,9 +1,12 @@
+from collections import deque
 from enum import Enum, auto
-from typing import Any, Generator
+from typing import Any, Callable, Generator, TextIO
+
+from values import to_text, tag_literal
 
 __all__ = [
     "BlockType", "CompT", "DataType",
-    "Environment",
+    "Environment", "READ_BUFFER_SIZE",
     "Component", "Label",
     "Block", "BlockDef", "Stack"
 ]
@@ -91,19 +94,128 @@ class Component:
 def Label(text: str) -> Component:
     return Component(CompT.LABEL, text=text)
 
+UNSET = object()
+READ_BUFFER_SIZE = 1 << 16
+WRITE_BUFFER_SIZE = 1 << 16
+
 class Environment:
+    """
+    Variables live in a flat list of slots. Names are turned into slot indices once, when a stack is
+    compiled, so running blocks index the list instead of hashing names.
+    Indexing with a name still works, it just looks the slot up first.
+    Every slot also has a version that goes up on each write, so cached results can tell when a variable changed.
+    """
     def __init__(self):
-        self.globals = {}
-        self.sleep_timer = 0
+        self.slots: list = []
+        self.versions: list[int] = []
+        self.slot_names: list[str] = []
+        self.slot_index: dict[str, int] = {}
+        self.wake_time = 0.0
+        self.yield_frame = False
         self.output = []
-        self.input_line = None
-        self.stdin = ""
+        self.input_line = None  # prompt of the input block that is waiting for a line
+        self.input_lines: deque[str] = deque()
+        self.input_partial = ""
+        self.input_closed = False
+        self.input_count = 0  # lines read so far
+        self.memory_limit: int | None = None  # bytes the program may use, blocks that build big values check it
+        self.readers: dict[str, TextIO] = {}
+        self.writers: dict[str, TextIO] = {}
+
+    def feed_input(self, text: str):
+        """
+        Adds text to the program's input. Lines are only handed out once their newline arrived.
+        """
+        lines = (self.input_partial + text).split("\n")
+        self.input_partial = lines.pop()
+        self.input_lines.extend(line.removesuffix("\r") for line in lines)
 
-    def __getitem__(self, item):
-        return self.globals[item]
+    def close_input(self):
+        """
+        No more input is coming: an unfinished last line becomes a line, and reading past the end gives "".
+        """
+        if self.input_partial:
+            self.input_lines.append(self.input_partial)
+            self.input_partial = ""
+        self.input_closed = True
 
-    def __setitem__(self, key, value):
-        self.globals[key] = value
+    def read_input(self) -> str | None:
+        """
+        The next line of input, "" once the input ended, or None if it has to be waited for.
+        """
+        if self.input_lines:
+            self.input_count += 1
+            return self.input_lines.popleft()
+        return "" if self.input_closed else None
+
+    def reader(self, path: str) -> TextIO:
+        """
+        File opened for reading, shared by every block that reads ``path`` during this run.
+        """
+        file = self.readers.get(path)
+        if file is None:
+            self.flush_writer(path)
+            file = self.readers[path] = open(path, buffering=READ_BUFFER_SIZE)
+        return file
+
+    def writer(self, path: str, append: bool = False) -> TextIO:
+        """
+        Buffered file kept open for the run. The first block to write ``path`` decides whether it is
+        truncated (``append=False``) or added to; every later write goes to the end of it.
+        """
+        file = self.writers.get(path)
+        if file is None:
+            file = self.writers[path] = open(path, "a" if append else "w", buffering=WRITE_BUFFER_SIZE)
+        return file
+
+    def flush_writer(self, path: str):
+        """
+        Makes what this run wrote to ``path`` so far visible to readers.
+        """
+        if path in self.writers:
+            self.writers[path].flush()
+
+    def close(self):
+        """
+        Flushes and closes the files the run opened. Called when the run ends, however it ends.
+        """
+        for file in self.writers.values():
+            file.close()
+        self.writers.clear()
+        for file in self.readers.values():
+            file.close()
+        self.readers.clear()
+
+    def slot(self, name: str) -> int:
+        index = self.slot_index.get(name)
+        if index is None:
+            index = len(self.slots)
+            self.slot_index[name] = index
+            self.slot_names.append(name)
+            self.slots.append(UNSET)
+            self.versions.append(0)
+        return index
+
+    @property
+    def globals(self) -> dict[str, object]:
+        """
+        Name to value view of the variables, for debugging.
+        """
+        return {name: value for name, value in zip(self.slot_names, self.slots) if value is not UNSET}
+
+    def __getitem__(self, item: int | str):
+        if item.__class__ is not int:
+            item = self.slot(item)
+        value = self.slots[item]
+        if value is UNSET:
+            raise KeyError(self.slot_names[item])
+        return value
+
+    def __setitem__(self, key: int | str, value):
+        if key.__class__ is not int:
+            key = self.slot(key)
+        self.slots[key] = value
+        self.versions[key] += 1
 
 class BlockDef:
     """
@@ -117,6 +229,11 @@ class BlockDef:
         self.non_label_components = list(filter(lambda c: c.type != CompT.LABEL, self.components))
         self.color = color
         self.execute = lambda v, e, b: None
+        self.evaluate: Callable[[list, Environment, Block], object] | None = None
+        self.suspends = False
+        self.lazy: set[int] = set()  # inputs the block evaluates itself, through block.get_value
+        self.pure = False
+        self.reads_variables = False
         self.output_type = output_type
 
     def input_id(self, id: int) -> Component:
@@ -143,6 +260,55 @@ class BlockDef:
 
         return wrapper
 
+    def on_suspend(self):
+        """
+        For reporters that may have to wait (e.g. for input): the function is a generator that yields while
+        it waits, which gives the frame back to other scripts, and returns the value.
+
+        Example::
+
+            @block.on_suspend()
+            def method(params, environment, block):
+                while (line := environment.read_input()) is None:
+                    environment.yield_frame = True
+                    yield
+                return line
+
+        """
+        def wrapper(func):
+            self.execute = func
+            self.suspends = True
+            return func
+
+        return wrapper
+
+    def on_evaluate(self, pure: bool = False, reads_variables: bool = False):
+        """
+        For reporters that only compute a value: the function returns it instead of yielding it,
+        so evaluating the block doesn't create a generator.
+        ``pure`` means the result only depends on the inputs, so it may be computed ahead of time.
+        ``reads_variables`` means it only depends on the inputs and the variables named by its variable inputs,
+        so it may be reused while those variables don't change.
+
+        Example::
+
+            @block.on_evaluate()
+            def method(params, environment, block):
+                return params[0] + params[1]
+
+        """
+        def wrapper(func):
+            def execute(params: list, environment: Environment, block: Block):
+                yield func(params, environment, block)
+
+            self.evaluate = func
+            self.execute = execute
+            self.pure = pure
+            self.reads_variables = reads_variables
+            return func
+
+        return wrapper
+
     def __repr__(self):
         display = []
 
@@ -193,6 +359,7 @@ class Block:
         self.values = values
         self.rect: tuple[int | float, int | float, int | float, int | float] = 0, 0, 0, 0 # set at render time
         self.values_rect: list[tuple[int | float, int | float, int | float, int | float]] = [] # set at render time
+        self.origin: Block = self # the workspace block this one was derived from, for passes that copy the tree
 
     def copy(self) -> 'Block':
         copied_values = []
@@ -210,24 +377,59 @@ class Block:
     def __hash__(self):
         return hash(hash(self.definition) + hash(tuple(self.values)) + hash(self.rect) + hash(tuple(self.values_rect)))
 
-    def execute(self, environment: Environment) -> Generator | None:
-        # print(self)
+    def parse_values(self, environment: Environment) -> list:
         parsed = []
         for i, value in enumerate(self.values):
+            if i in self.definition.lazy:
+                parsed.append(None)
+                continue
             if isinstance(value, Block):
                 while isinstance(value, Block):
-                    value = next(value.execute(environment))
-            elif value is None:
-                value = self.definition.input_id(i).default
+                    value = value.evaluate(environment)
+            else:
+                if value is None:
+                    value = self.definition.input_id(i).default
+                if self.definition.input_id(i).type == CompT.INPUT:
+                    value = tag_literal(value)  # like the compiler does, so folded and compiled blocks agree
 
             if self.definition.input_id(i).type == CompT.NUMBER_INPUT:
                 value = float(value)
             elif self.definition.input_id(i).type == CompT.TEXT_INPUT:
-                value = str(value)
+                value = to_text(value)
 
             parsed.append(value)
 
-        return self.definition.execute(parsed, environment, self)
+        return parsed
+
+    def execute(self, environment: Environment) -> Generator | None:
+        return self.definition.execute(self.parse_values(environment), environment, self)
+
+    def evaluate(self, environment: Environment) -> object:
+        """
+        Value of a reporter block.
+        """
+        if self.definition.evaluate is not None:
+            return self.definition.evaluate(self.parse_values(environment), environment, self)
+        if self.definition.suspends:
+            # only the Scheduler can resume it, e.g. once input arrived or a called procedure returned
+            generator = self.execute(environment)
+            try:
+                next(generator)
+            except StopIteration as stop:
+                return stop.value
+            generator.close()
+            raise Exception(f"The {self.definition.id} block has to wait, it can only run in a Scheduler.")
+        return next(self.execute(environment))
+
+    waits = False
+    tail = False  # a call whose result is the result of the procedure it is in, see procedures.mark_tail_calls
+
+    def wait_value(self, index: int, environment: Environment):
+        """
+        ``get_value`` for inputs that may suspend; use with ``yield from`` when ``waits`` is set.
+        """
+        return self.get_value(index, environment)
+        yield
 
     def get_value(self, index: int, environment: Environment) -> object:
         value = self.values[index]
@@ -235,7 +437,7 @@ class Block:
             return self.definition.input_id(index).default
         if isinstance(value, Block):
             while isinstance(value, Block):
-                value = next(value.execute(environment))
+                value = value.evaluate(environment)
         return value
 
     def __repr__(self):
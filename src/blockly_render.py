@@ -1,8 +1,86 @@
 import pygame as pg
+from collections import OrderedDict
 from functools import cache
 from blockly import *
 from constants import *
 from blocks import ELLIPSIS
+from metrics import METRICS
+
+RENDER_CACHE_BYTES = 64 << 20
+ZOOM_LEVELS = (0.2, 0.3, 0.5, 0.75, 1, 1.25, 1.5, 2)
+LOD_ZOOM = 0.45  # below this, blocks are drawn as colored boxes without text
+
+Geometry = tuple[tuple, tuple]  # rect, values_rect
+
+def block_key(value: object) -> object:
+    """
+    What a block looks like, as a hashable value: its definition and, recursively, its inputs.
+    Unlike ``Block.__hash__`` it leaves out the geometry, which rendering sets.
+    """
+    if isinstance(value, Block):
+        return value.definition, tuple(block_key(child) for child in value.values)
+    if isinstance(value, Stack):
+        return Stack, tuple(block_key(block) for block in value.blocks)
+    return value.__class__, value  # 1, 1.0 and True are equal, but don't look the same
+
+def subtree_blocks(value: object):
+    """
+    Every block in ``value``, parents first, in the same order for blocks with the same key.
+    """
+    if isinstance(value, Stack):
+        for block in value.blocks:
+            yield from subtree_blocks(block)
+    elif isinstance(value, Block):
+        yield value
+        for child in value.values:
+            yield from subtree_blocks(child)
+
+class RenderCache:
+    """
+    Rendered blocks by ``block_key``, so identical blocks share one surface and nothing is painted twice.
+    The least recently used surfaces are dropped once they take more than ``max_bytes``.
+    A hit also puts back the ``rect`` and ``values_rect`` of every block in the subtree, which clicks rely on.
+    Surfaces handed out are shared, so they must not be drawn on.
+    """
+    def __init__(self, max_bytes: int = RENDER_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.entries: OrderedDict[object, tuple[pg.Surface, list[Geometry], int]] = OrderedDict()
+
+    def get(self, key: object, block: Block) -> pg.Surface | None:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        self.entries.move_to_end(key)
+        surf, geometry, _ = entry
+        for sub_block, (rect, values_rect) in zip(subtree_blocks(block), geometry):
+            sub_block.rect = rect
+            sub_block.values_rect[:] = values_rect
+        return surf
+
+    def put(self, key: object, block: Block, surf: pg.Surface):
+        size = surf.get_pitch() * surf.get_height()
+        if size > self.max_bytes:
+            return
+        if key in self.entries:
+            self.bytes -= self.entries.pop(key)[2]
+        geometry = [(sub_block.rect, tuple(sub_block.values_rect)) for sub_block in subtree_blocks(block)]
+        self.entries[key] = surf, geometry, size
+        self.bytes += size
+        while self.bytes > self.max_bytes:
+            self.bytes -= self.entries.popitem(last=False)[1][2]
+
+    def clear(self):
+        self.entries.clear()
+        self.bytes = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __repr__(self):
+        return f"RenderCache({len(self.entries)} surfaces, {self.bytes} bytes)"
+
+RENDER_CACHE = RenderCache()
 
 @cache
 def outline(color: tuple[int, int, int]) -> tuple[int, int, int]:
@@ -227,8 +305,19 @@ def get_left_padding(block: Block, height: int) -> int:
             return DEFAULT_PADDING * 1.5
     return 0
 
-#@cache
 def render_block(block: Block) -> pg.Surface:
+    key = block_key(block)
+    surf = RENDER_CACHE.get(key, block)
+    if surf is not None:
+        METRICS.count("block cache hits")
+        return surf
+
+    METRICS.count("block cache misses")
+    surf = paint_block(block)
+    RENDER_CACHE.put(key, block, surf)
+    return surf
+
+def paint_block(block: Block) -> pg.Surface:
     render_queue: list[tuple[list[pg.Surface], tuple[int, int]]] = []
     """
     Dimensions: tuple[int, int]
@@ -378,9 +467,67 @@ def render_stack(stack: Stack) -> pg.Surface:
         add = DEFAULT_PADDING * int(stack.blocks[-1].definition.block_type in (BlockType.HAT, BlockType.STATEMENT))
 
     surf = pg.Surface((max_size, prev_y + add), pg.SRCALPHA)
+    METRICS.count("surfaces")
     for block in blocks:
         block[1].rect = (0, 0, 0, 0)
         block[1].rect = (0, block[2], block[0].get_width(), block[0].get_height())
         surf.blit(block[0], (0, block[2]))
 
     return surf
+
+def block_positions(value: Block | Stack, x: number, y: number):
+    """
+    Every block in ``value`` with its position, given the position (x, y) of ``value``. Uses the geometry of the last render.
+    """
+    if isinstance(value, Stack):
+        for block in value.blocks:
+            yield from block_positions(block, x + block.rect[0], y + block.rect[1])
+        return
+
+    yield value, x, y
+    for child, rect in zip(value.values, value.values_rect):
+        if isinstance(child, (Block, Stack)):
+            yield from block_positions(child, x + rect[0], y + rect[1] - DEFAULT_PADDING / 2)
+
+def render_outlines(stack: Stack, size: tuple[int, int], zoom: float) -> pg.Surface:
+    """
+    The stack as boxes in the colors of its blocks, at ``zoom``. Text would be unreadable at that size anyway.
+    """
+    surf = pg.Surface((max(int(size[0] * zoom), 1), max(int(size[1] * zoom), 1)), pg.SRCALPHA)
+    for block, x, y in block_positions(stack, 0, 0):
+        color = block.definition.color
+        rect = (x * zoom, y * zoom, block.rect[2] * zoom, block.rect[3] * zoom)
+        pg.draw.rect(surf, color, rect)
+        pg.draw.rect(surf, outline(color), rect, 1)
+    return surf
+
+class ZoomPyramid:
+    """
+    One rendered stack at a few zoom levels (``ZOOM_LEVELS``), each scaled the first time it is needed.
+    While the zoom animates, the nearest level is shown instead of scaling the full surface every frame.
+    Below ``LOD_ZOOM`` the stack is drawn with ``render_outlines``.
+    """
+    def __init__(self, stack: Stack, surf: pg.Surface):
+        self.stack = stack
+        self.surf = surf
+        self.levels: dict[float, pg.Surface] = {}
+
+    def scale(self, zoom: float) -> pg.Surface:
+        if zoom == 1:
+            return self.surf
+        METRICS.count("surfaces")  # the full size surface was counted by render_stack
+        if zoom < LOD_ZOOM:
+            return render_outlines(self.stack, self.surf.get_size(), zoom)
+        return pg.transform.scale_by(self.surf, zoom)
+
+    def get(self, zoom: float, exact: bool = True) -> pg.Surface:
+        """
+        The stack at ``zoom``, or at the zoom level nearest to it if not ``exact``.
+        """
+        level = min(ZOOM_LEVELS, key=lambda level: abs(level - zoom))
+        if exact and level != zoom:
+            return self.scale(zoom)
+        surf = self.levels.get(level)
+        if surf is None:
+            surf = self.levels[level] = self.scale(level)
+        return surf
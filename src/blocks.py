@@ -1,7 +1,17 @@
 import math
 import random
+import time
+
+try:
+    import numpy as np
+except ImportError:  # the list blocks say so when they run
+    np = None
 
 from blockly import *
+from procedures import Call, ProcedureReturn, to_name
+from quota import QuotaExceeded, check_size
+from text_buffer import TextBuffer, share
+from values import FORMATTERS, parse_number, str2
 
 class Category:
     def __init__(self, name: str, description: str, color: tuple[int, int, int], blocks: list[BlockDef]):
@@ -29,11 +39,16 @@ class BlockCategories:
     ])
     INPUT = Category("Input", "Gathers input from the user.", (158, 168, 255), [
         BlockDef("input", BlockType.REPORTER, [Label("ask"), Component(CompT.TEXT_INPUT, "What's your name? ")], output_type=DataType.TEXT),
-        BlockDef("read-file", BlockType.REPORTER, [Label("read from file"), Component(CompT.TEXT_INPUT, "input.txt")], output_type=DataType.TEXT)
+        BlockDef("read-file", BlockType.REPORTER, [Label("read from file"), Component(CompT.TEXT_INPUT, "input.txt")], output_type=DataType.TEXT),
+        BlockDef("for-line", BlockType.STATEMENT, [Label("for each line"), Component(CompT.VARIABLE_INPUT), Label("in file"), Component(CompT.TEXT_INPUT, "input.txt"), Component(CompT.STATEMENT_INPUT)]),
+        BlockDef("read-lines", BlockType.REPORTER, [Label("read next"), Component(CompT.NUMBER_INPUT, 1), Label("lines from"), Component(CompT.TEXT_INPUT, "input.txt")], output_type=DataType.TEXT),
+        BlockDef("read-chars", BlockType.REPORTER, [Label("read next"), Component(CompT.NUMBER_INPUT, 1024), Label("characters from"), Component(CompT.TEXT_INPUT, "input.txt")], output_type=DataType.TEXT),
+        BlockDef("file-ended", BlockType.REPORTER, [Label("end of file"), Component(CompT.TEXT_INPUT, "input.txt")], output_type=DataType.BOOLEAN)
     ])
     OUTPUT = Category("Output", "How the program outputs information.", (255, 158, 182), [
         BlockDef("print", BlockType.STATEMENT, [Label("say"), Component(CompT.TEXT_INPUT, "Hello world!")]),
-        BlockDef("write-file", BlockType.STATEMENT, [Label("write to file"), Component(CompT.TEXT_INPUT, "output.txt"), Label("contents"), Component(CompT.TEXT_INPUT, "Hello world!")])
+        BlockDef("write-file", BlockType.STATEMENT, [Label("write to file"), Component(CompT.TEXT_INPUT, "output.txt"), Label("contents"), Component(CompT.TEXT_INPUT, "Hello world!")]),
+        BlockDef("append-file", BlockType.STATEMENT, [Label("append line"), Component(CompT.TEXT_INPUT, "Hello world!"), Label("to file"), Component(CompT.TEXT_INPUT, "output.txt")])
     ])
     NUMBER = Category("Number", "Manipulates numbers and does calculations.", (164, 255, 158), [
         BlockDef("+", BlockType.REPORTER, [Component(CompT.NUMBER_INPUT), Label("+"), Component(CompT.NUMBER_INPUT)], output_type=DataType.NUMBER),
@@ -79,6 +94,9 @@ class BlockCategories:
         BlockDef("endswith", BlockType.REPORTER, [Component(CompT.TEXT_INPUT, "Hello world!"), Label("ends with"), Component(CompT.TEXT_INPUT, "!")], output_type=DataType.BOOLEAN),
         BlockDef("str-remove", BlockType.REPORTER, [Label("remove all"), Component(CompT.TEXT_INPUT, "o"), Label("from"), Component(CompT.TEXT_INPUT, "Hello world!")], output_type=DataType.TEXT),
         BlockDef("str-replace", BlockType.REPORTER, [Label("replace all"), Component(CompT.TEXT_INPUT, "o"), Label("with"), Component(CompT.TEXT_INPUT, "a"), Label("of"), Component(CompT.TEXT_INPUT, "Hello world!")], output_type=DataType.TEXT),
+        BlockDef("buffer-append", BlockType.STATEMENT, [Label("add text"), Component(CompT.INPUT, "Hello world!"), Label("to the end of"), Component(CompT.VARIABLE_INPUT)]),
+        BlockDef("buffer-len", BlockType.REPORTER, [Label("length of text in"), Component(CompT.VARIABLE_INPUT)], output_type=DataType.NUMBER),
+        BlockDef("buffer-text", BlockType.REPORTER, [Label("text in"), Component(CompT.VARIABLE_INPUT)], output_type=DataType.TEXT),
     ])
     VARIABLE = Category("Variable", "Stores and change variables.", (255, 198, 158), [
         BlockDef("get-var", BlockType.REPORTER, [Label("get"), Component(CompT.VARIABLE_INPUT)], output_type=DataType.ANY),
@@ -86,26 +104,67 @@ class BlockCategories:
         BlockDef("increment", BlockType.STATEMENT, [Label("increment"), Component(CompT.VARIABLE_INPUT), Label("by"), Component(CompT.NUMBER_INPUT, 1)]),
         BlockDef("decrement", BlockType.STATEMENT, [Label("decrement"), Component(CompT.VARIABLE_INPUT), Label("by"), Component(CompT.NUMBER_INPUT, 1)])
     ])
-    # PROCEDURE = Category("Procedure", "Create and use your own custom blocks", (202, 158, 255), [
-    #     BlockDef("return", BlockType.CAP, [Label("return"), Component(CompT.INPUT)])
-    # ])
-
-def str2(obj: object) -> str:
-    if isinstance(obj, (int, float)):
-        return f"{obj:g}"
-    elif is_number(obj):
-        return f"{float(obj):g}"
-    else:
-        return str(obj)
-
-def is_number(thing) -> bool:
-    if isinstance(thing, (int, float)):
-        return True
-    try:
-        float(thing)
-        return True
-    except ValueError:
-        return False
+    LIST = Category("List", "Builds lists of numbers and calculates with whole lists at once.", (255, 236, 158), [
+        BlockDef("list-range", BlockType.REPORTER, [Label("numbers from"), Component(CompT.NUMBER_INPUT, 1), Label("to"), Component(CompT.NUMBER_INPUT, 10), Label("by"), Component(CompT.NUMBER_INPUT, 1)], output_type=DataType.ANY),
+        BlockDef("list-fill", BlockType.REPORTER, [Component(CompT.NUMBER_INPUT, 10), Label("copies of"), Component(CompT.NUMBER_INPUT, 0)], output_type=DataType.ANY),
+        BlockDef("list-parse", BlockType.REPORTER, [Label("list of"), Component(CompT.TEXT_INPUT, "1, 2, 3")], output_type=DataType.ANY),
+        BlockDef("list-add", BlockType.REPORTER, [Component(CompT.INPUT), Label("+ each"), Component(CompT.INPUT, 1)], output_type=DataType.ANY),
+        BlockDef("list-sub", BlockType.REPORTER, [Component(CompT.INPUT), Label("- each"), Component(CompT.INPUT, 1)], output_type=DataType.ANY),
+        BlockDef("list-mul", BlockType.REPORTER, [Component(CompT.INPUT), Label("× each"), Component(CompT.INPUT, 2)], output_type=DataType.ANY),
+        BlockDef("list-div", BlockType.REPORTER, [Component(CompT.INPUT), Label("÷ each"), Component(CompT.INPUT, 2)], output_type=DataType.ANY),
+        BlockDef("list-sum", BlockType.REPORTER, [Label("sum of"), Component(CompT.INPUT)], output_type=DataType.NUMBER),
+        BlockDef("list-min", BlockType.REPORTER, [Label("smallest of"), Component(CompT.INPUT)], output_type=DataType.NUMBER),
+        BlockDef("list-max", BlockType.REPORTER, [Label("largest of"), Component(CompT.INPUT)], output_type=DataType.NUMBER),
+        BlockDef("list-mean", BlockType.REPORTER, [Label("average of"), Component(CompT.INPUT)], output_type=DataType.NUMBER),
+        BlockDef("list-sort", BlockType.REPORTER, [Label("sorted"), Component(CompT.INPUT)], output_type=DataType.ANY),
+        BlockDef("list-slice", BlockType.REPORTER, [Label("items"), Component(CompT.NUMBER_INPUT, 1), Label("to"), Component(CompT.NUMBER_INPUT, 3), Label("of"), Component(CompT.INPUT)], output_type=DataType.ANY),
+        BlockDef("list-item", BlockType.REPORTER, [Label("item"), Component(CompT.NUMBER_INPUT, 1), Label("of"), Component(CompT.INPUT)], output_type=DataType.NUMBER),
+        BlockDef("list-len", BlockType.REPORTER, [Label("length of list"), Component(CompT.INPUT)], output_type=DataType.NUMBER)
+    ])
+    PROCEDURE = Category("Procedure", "Create and use your own custom blocks", (202, 158, 255), [
+        BlockDef("define", BlockType.HAT, [Label("define"), Component(CompT.TEXT_INPUT, "my block"), Label("with inputs"), Component(CompT.VARIABLE_INPUT), Component(CompT.VARIABLE_INPUT), Component(CompT.VARIABLE_INPUT)]),
+        BlockDef("call", BlockType.STATEMENT, [Label("run"), Component(CompT.TEXT_INPUT, "my block"), Label("with"), Component(CompT.INPUT), Component(CompT.INPUT), Component(CompT.INPUT)]),
+        BlockDef("call-value", BlockType.REPORTER, [Label("result of"), Component(CompT.TEXT_INPUT, "my block"), Label("with"), Component(CompT.INPUT), Component(CompT.INPUT), Component(CompT.INPUT)], output_type=DataType.ANY),
+        BlockDef("return", BlockType.CAP, [Label("return"), Component(CompT.INPUT)])
+    ])
+
+if np is not None:
+    FORMATTERS[np.ndarray] = lambda array: ", ".join(f"{item:g}" for item in array.tolist())
+
+def require_numpy():
+    if np is None:
+        raise Exception("The list blocks need NumPy. Install it with: pip install numpy")
+
+def to_array(value: object) -> 'np.ndarray | float':
+    """
+    Lists stay as they are, numbers become a float (which NumPy broadcasts), and text is read as comma separated numbers.
+    """
+    require_numpy()
+    if isinstance(value, np.ndarray):
+        return value
+    if (number := parse_number(value)) is not None:
+        return number
+    text = str(value).strip()
+    if not text:
+        return np.empty(0)
+    return np.array([float(item) for item in text.split(",")])
+
+def to_values(value: object, what: str) -> 'np.ndarray':
+    """
+    ``to_array`` for the blocks that need at least one number, like ``smallest of``: an empty list is an error.
+    """
+    array = np.atleast_1d(to_array(value))
+    if not array.size:
+        raise ValueError(f"The {what} of an empty list isn't defined.")
+    return array
+
+def iterate(value: object):
+    """
+    What ``for each`` goes over. Lists become plain floats in one go instead of one NumPy scalar at a time.
+    """
+    if np is not None and isinstance(value, np.ndarray):
+        return value.tolist()
+    return value
 
 # CONTROL
 for ___ in range(1):
@@ -118,9 +177,10 @@ for ___ in range(1):
 
     @BlockCategories.CONTROL.blocks[1].on_trigger()
     def _(params: list, environment: Environment, block: Block):
-        environment.sleep_timer = params[0]
-        while environment.sleep_timer > 0:
-            environment.sleep_timer -= 1 / 60
+        wake_time = time.perf_counter() + params[0]
+        environment.wake_time = wake_time
+        while time.perf_counter() < wake_time:
+            environment.yield_frame = True
             yield
 
     @BlockCategories.CONTROL.blocks[2].on_trigger()
@@ -131,30 +191,35 @@ for ___ in range(1):
             except LoopBreak:
                 break
             except LoopContinue:
-                continue
+                pass
+            yield  # every iteration is a step, so even an empty loop can be preempted
 
     @BlockCategories.CONTROL.blocks[3].on_trigger()
     def _(params: list, environment: Environment, block: Block):
-        for value in environment[params[1]]:
+        for value in iterate(environment[params[1]]):
             environment[params[0]] = value
             try:
                 yield from params[2].execute(environment)
             except LoopBreak:
                 break
             except LoopContinue:
-                continue
+                pass
+            yield
+
+    BlockCategories.CONTROL.blocks[4].lazy = {0}  # the condition is evaluated before every iteration below
 
     @BlockCategories.CONTROL.blocks[4].on_trigger()
     def _(params: list, environment: Environment, block: Block):
         #print(block.get_value(0, environment))
-        while block.get_value(0, environment):
+        while (yield from block.wait_value(0, environment)) if block.waits else block.get_value(0, environment):
             #print("iter")
             try:
                 yield from params[1].execute(environment)
             except LoopBreak:
                 break
             except LoopContinue:
-                continue
+                pass
+            yield
 
     @BlockCategories.CONTROL.blocks[5].on_trigger()
     def _(params: list, environment: Environment, block: Block):
@@ -172,8 +237,8 @@ for ___ in range(1):
     def _(params: list, environment: Environment, block: Block):
         try:
             yield from params[0].execute(environment)
-        except RuntimeError:
-            raise # quit
+        except (RuntimeError, ProcedureReturn, QuotaExceeded):
+            raise # quit, return from the procedure, or a limit the program can't get around
         except Exception:
             yield from params[1].execute(environment)
 
@@ -191,16 +256,57 @@ for ___ in range(1):
 
 # INPUT
 for ___ in range(1):
-    @BlockCategories.INPUT.blocks[0].on_trigger()
+    @BlockCategories.INPUT.blocks[0].on_suspend()
     def _(params: list, environment: Environment, block: Block):
         environment.input_line = str2(params[0])
-        return environment.stdin # TODO: fix this
+        while (line := environment.read_input()) is None:
+            environment.yield_frame = True
+            yield
+        environment.input_line = None
+        return line
 
-    @BlockCategories.INPUT.blocks[1].on_trigger()
+    @BlockCategories.INPUT.blocks[1].on_evaluate()
     def _(params: list, environment: Environment, block: Block):
+        environment.flush_writer(params[0])
         with open(params[0]) as file:
-            data = file.read()
-        yield data
+            return file.read()
+
+    @BlockCategories.INPUT.blocks[2].on_trigger()
+    def _(params: list, environment: Environment, block: Block):
+        environment.flush_writer(params[1])
+        with open(params[1], buffering=READ_BUFFER_SIZE) as file:
+            for line in file:
+                environment[params[0]] = line.rstrip("\n")
+                try:
+                    yield from params[2].execute(environment)
+                except LoopBreak:
+                    break
+                except LoopContinue:
+                    pass
+                yield
+
+    @BlockCategories.INPUT.blocks[3].on_evaluate()
+    def _(params: list, environment: Environment, block: Block):
+        file = environment.reader(params[1])
+        lines = []
+        for __ in range(int(params[0])):
+            line = file.readline()
+            if not line:
+                break
+            lines.append(line.rstrip("\n"))
+        return "\n".join(lines)
+
+    @BlockCategories.INPUT.blocks[4].on_evaluate()
+    def _(params: list, environment: Environment, block: Block):
+        return environment.reader(params[1]).read(max(int(params[0]), 0))
+
+    @BlockCategories.INPUT.blocks[5].on_evaluate()
+    def _(params: list, environment: Environment, block: Block):
+        file = environment.reader(params[0])
+        position = file.tell()
+        ended = not file.read(1)
+        file.seek(position)
+        return ended
 
 # OUTPUT
 for ___ in range(1):
@@ -211,231 +317,367 @@ for ___ in range(1):
 
     @BlockCategories.OUTPUT.blocks[1].on_trigger()
     def _(params: list, environment: Environment, block: Block):
-        with open(params[0], "w") as f:
-            f.write(str2(params[1]))
+        environment.writer(params[0]).write(str2(params[1]))
+        yield
+
+    @BlockCategories.OUTPUT.blocks[2].on_trigger()
+    def _(params: list, environment: Environment, block: Block):
+        file = environment.writer(params[1], append=True)
+        file.write(str2(params[0]))
+        file.write("\n")
         yield
 
 # NUMBER
 for ___ in range(1):
-    @BlockCategories.NUMBER.blocks[0].on_trigger()
+    @BlockCategories.NUMBER.blocks[0].on_evaluate(pure=True)
     def _(params: list, environment: Environment, block: Block):
-        yield params[0] + params[1]
+        return params[0] + params[1]
 
-    @BlockCategories.NUMBER.blocks[1].on_trigger()
+    @BlockCategories.NUMBER.blocks[1].on_evaluate(pure=True)
     def _(params: list, environment: Environment, block: Block):
-        yield params[0] - params[1]
+        return params[0] - params[1]
 
 
-    @BlockCategories.NUMBER.blocks[2].on_trigger()
+    @BlockCategories.NUMBER.blocks[2].on_evaluate(pure=True)
     def _(params: list, environment: Environment, block: Block):
-        yield params[0] * params[1]
+        return params[0] * params[1]
 
 
-    @BlockCategories.NUMBER.blocks[3].on_trigger()
+    @BlockCategories.NUMBER.blocks[3].on_evaluate(pure=True)
     def _(params: list, environment: Environment, block: Block):
-        yield params[0] / params[1]
+        return params[0] / params[1]
 
 
-    @BlockCategories.NUMBER.blocks[4].on_trigger()
+    @BlockCategories.NUMBER.blocks[4].on_evaluate(pure=True)
     def _(params: list, environment: Environment, block: Block):
-        yield params[0] ** params[1]
+        return params[0] ** params[1]
 
 
-    @BlockCategories.NUMBER.blocks[5].on_trigger()
+    @BlockCategories.NUMBER.blocks[5].on_evaluate(pure=True)
     def _(params: list, environment: Environment, block: Block):
-        yield params[0] % params[1]
+        return params[0] % params[1]
 
 
-    @BlockCategories.NUMBER.blocks[6].on_trigger()
+    @BlockCategories.NUMBER.blocks[6].on_evaluate()
     def _(params: list, environment: Environment, block: Block):
-        yield random.randint(int(params[0]), int(params[1]))
+        return random.randint(int(params[0]), int(params[1]))
 
 
-    @BlockCategories.NUMBER.blocks[7].on_trigger()
+    @BlockCategories.NUMBER.blocks[7].on_evaluate(pure=True)
     def _(params: list, environment: Environment, block: Block):
-        yield float(params[0])
+        return float(params[0])
 
 
-    @BlockCategories.NUMBER.blocks[8].on_trigger()
+    @BlockCategories.NUMBER.blocks[8].on_evaluate(pure=True)
     def _(params: list, environment: Environment, block: Block):
-        yield int(params[0], params[1])
+        return int(params[0], params[1])
 
 
-    @BlockCategories.NUMBER.blocks[9].on_trigger()
+    @BlockCategories.NUMBER.blocks[9].on_evaluate(pure=True)
     def _(params: list, environment: Environment, block: Block):
-        yield round(params[0])
+        return round(params[0])
 
 
-    @BlockCategories.NUMBER.blocks[10].on_trigger()
+    @BlockCategories.NUMBER.blocks[10].on_evaluate(pure=True)
     def _(params: list, environment: Environment, block: Block):
-        yield math.floor(params[0])
+        return math.floor(params[0])
 
 
-    @BlockCategories.NUMBER.blocks[11].on_trigger()
+    @BlockCategories.NUMBER.blocks[11].on_evaluate(pure=True)
     def _(params: list, environment: Environment, block: Block):
-        yield math.ceil(params[0])
+        return math.ceil(params[0])
 
 
-    @BlockCategories.NUMBER.blocks[12].on_trigger()
+    @BlockCategories.NUMBER.blocks[12].on_evaluate(pure=True)
     def _(params: list, environment: Environment, block: Block):
-        yield abs(params[0])
+        return abs(params[0])
 
 
-    @BlockCategories.NUMBER.blocks[13].on_trigger()
+    @BlockCategories.NUMBER.blocks[13].on_evaluate(pure=True)
     def _(params: list, environment: Environment, block: Block):
-        yield - params[0]
+        return - params[0]
 
 
-    @BlockCategories.NUMBER.blocks[14].on_trigger()
+    @BlockCategories.NUMBER.blocks[14].on_evaluate(pure=True)
     def _(params: list, environment: Environment, block: Block):
-        yield params[1] ** (1 / params[0])
+        return params[1] ** (1 / params[0])
 
 
-    @BlockCategories.NUMBER.blocks[15].on_trigger()
+    @BlockCategories.NUMBER.blocks[15].on_evaluate(pure=True)
     def _(params: list, environment: Environment, block: Block):
-        yield math.log(params[1], params[0])
+        return math.log(params[1], params[0])
 
 # COMPARISON
+def equal(a: object, b: object) -> bool:
+    """
+    Numbers compare as numbers, anything else by how it is shown.
+    """
+    if a.__class__ is float and b.__class__ is float:
+        return a == b
+    first = parse_number(a)
+    if first is not None:
+        second = parse_number(b)
+        if second is not None:
+            return first == second
+    return str2(a) == str2(b)
+
 for ___ in range(1):
-    @BlockCategories.COMPARISON.blocks[0].on_trigger()
+    @BlockCategories.COMPARISON.blocks[0].on_evaluate(pure=True)
     def _(params: list, environment: Environment, block: Block):
-        if is_number(params[0]) and is_number(params[1]):
-            yield float(params[0]) == float(params[1])
-        yield str2(params[0]) == str2(params[1])
+        return equal(params[0], params[1])
 
 
-    @BlockCategories.COMPARISON.blocks[1].on_trigger()
+    @BlockCategories.COMPARISON.blocks[1].on_evaluate(pure=True)
     def _(params: list, environment: Environment, block: Block):
-        if is_number(params[0]) and is_number(params[1]):
-            yield float(params[0]) != float(params[1])
-        yield str2(params[0]) != str2(params[1])
+        return not equal(params[0], params[1])
 
 
-    @BlockCategories.COMPARISON.blocks[2].on_trigger()
+    @BlockCategories.COMPARISON.blocks[2].on_evaluate(pure=True)
     def _(params: list, environment: Environment, block: Block):
-        yield params[0] > params[1]
+        return params[0] > params[1]
 
 
-    @BlockCategories.COMPARISON.blocks[3].on_trigger()
+    @BlockCategories.COMPARISON.blocks[3].on_evaluate(pure=True)
     def _(params: list, environment: Environment, block: Block):
-        yield params[0] >= params[1]
+        return params[0] >= params[1]
 
 
-    @BlockCategories.COMPARISON.blocks[4].on_trigger()
+    @BlockCategories.COMPARISON.blocks[4].on_evaluate(pure=True)
     def _(params: list, environment: Environment, block: Block):
-        yield params[0] < params[1]
+        return params[0] < params[1]
 
 
-    @BlockCategories.COMPARISON.blocks[5].on_trigger()
+    @BlockCategories.COMPARISON.blocks[5].on_evaluate(pure=True)
     def _(params: list, environment: Environment, block: Block):
-        yield params[0] <= params[1]
+        return params[0] <= params[1]
 
 # BOOLEAN
 for ___ in range(1):
-    @BlockCategories.BOOLEAN.blocks[0].on_trigger()
+    @BlockCategories.BOOLEAN.blocks[0].on_evaluate(pure=True)
     def _(params: list, environment: Environment, block: Block):
-        yield bool(params[0])
+        return bool(params[0])
 
-    @BlockCategories.BOOLEAN.blocks[1].on_trigger()
+    @BlockCategories.BOOLEAN.blocks[1].on_evaluate(pure=True)
     def _(params: list, environment: Environment, block: Block):
-        yield not params[1]
+        return not params[0]
 
 
-    @BlockCategories.BOOLEAN.blocks[2].on_trigger()
+    @BlockCategories.BOOLEAN.blocks[2].on_evaluate(pure=True)
     def _(params: list, environment: Environment, block: Block):
-        yield params[0] and params[1]
+        return params[0] and params[1]
 
 
-    @BlockCategories.BOOLEAN.blocks[3].on_trigger()
+    @BlockCategories.BOOLEAN.blocks[3].on_evaluate(pure=True)
     def _(params: list, environment: Environment, block: Block):
-        yield params[0] or params[1]
+        return params[0] or params[1]
 
 
-    @BlockCategories.BOOLEAN.blocks[4].on_trigger()
+    @BlockCategories.BOOLEAN.blocks[4].on_evaluate(pure=True)
     def _(params: list, environment: Environment, block: Block):
-        yield bool(bool(params[0]) ^ bool(params[1]))
+        return bool(bool(params[0]) ^ bool(params[1]))
 
 
-    @BlockCategories.BOOLEAN.blocks[5].on_trigger()
+    @BlockCategories.BOOLEAN.blocks[5].on_evaluate(pure=True)
     def _(params: list, environment: Environment, block: Block):
-        yield bool(params[0])
+        return bool(params[0])
 
 # TEXT
 for ___ in range(1):
-    @BlockCategories.TEXT.blocks[0].on_trigger()
+    @BlockCategories.TEXT.blocks[0].on_evaluate(pure=True)
     def _(params: list, environment: Environment, block: Block):
-        yield str2(params[0]) + str2(params[1])
+        first, second = str2(params[0]), str2(params[1])
+        check_size(environment, len(first) + len(second))
+        return first + second
 
 
-    @BlockCategories.TEXT.blocks[1].on_trigger()
+    @BlockCategories.TEXT.blocks[1].on_evaluate(pure=True)
     def _(params: list, environment: Environment, block: Block):
-        yield str2(params[0])
+        return str2(params[0])
 
 
-    @BlockCategories.TEXT.blocks[2].on_trigger()
+    @BlockCategories.TEXT.blocks[2].on_evaluate(pure=True)
     def _(params: list, environment: Environment, block: Block):
-        yield params[1][int(params[0] - 1)]
+        return params[1][int(params[0] - 1)]
 
 
-    @BlockCategories.TEXT.blocks[3].on_trigger()
+    @BlockCategories.TEXT.blocks[3].on_evaluate(pure=True)
     def _(params: list, environment: Environment, block: Block):
-        yield len(params[0])
+        return len(params[0])
 
 
-    @BlockCategories.TEXT.blocks[4].on_trigger()
+    @BlockCategories.TEXT.blocks[4].on_evaluate(pure=True)
     def _(params: list, environment: Environment, block: Block):
-        yield params[1] in params[0]
+        return params[1] in params[0]
 
 
-    @BlockCategories.TEXT.blocks[5].on_trigger()
+    @BlockCategories.TEXT.blocks[5].on_evaluate(pure=True)
     def _(params: list, environment: Environment, block: Block):
-        yield params[0].startswith(params[1])
+        return params[0].startswith(params[1])
 
 
-    @BlockCategories.TEXT.blocks[6].on_trigger()
+    @BlockCategories.TEXT.blocks[6].on_evaluate(pure=True)
     def _(params: list, environment: Environment, block: Block):
-        yield params[0].endswith(params[1])
+        return params[0].endswith(params[1])
 
 
-    @BlockCategories.TEXT.blocks[7].on_trigger()
+    @BlockCategories.TEXT.blocks[7].on_evaluate(pure=True)
     def _(params: list, environment: Environment, block: Block):
-        yield params[1].replace(params[0], "")
+        return params[1].replace(params[0], "")
 
 
-    @BlockCategories.TEXT.blocks[6].on_trigger()
+    @BlockCategories.TEXT.blocks[8].on_evaluate(pure=True)
     def _(params: list, environment: Environment, block: Block):
-        yield params[2].replace(params[0], params[1])
+        if len(params[1]) > len(params[0]):
+            check_size(environment, len(params[2]) + params[2].count(params[0]) * (len(params[1]) - len(params[0])))
+        return params[2].replace(params[0], params[1])
+
+    @BlockCategories.TEXT.blocks[9].on_trigger()
+    def _(params: list, environment: Environment, block: Block):
+        try:
+            buffer = environment[params[1]]
+        except KeyError:
+            buffer = TextBuffer()
+        if not isinstance(buffer, TextBuffer):
+            buffer = TextBuffer(str2(buffer))
+        elif buffer.shared:
+            buffer = buffer.copy()  # copy on write, the other variables keep the text they had
+        text = str2(params[0])
+        check_size(environment, len(buffer) + len(text))
+        buffer.append(text)
+        environment[params[1]] = buffer  # set it even if it was a buffer already: the variable changed
+        yield
+
+
+    @BlockCategories.TEXT.blocks[10].on_evaluate()
+    def _(params: list, environment: Environment, block: Block):
+        value = environment[params[0]]
+        return len(value) if isinstance(value, TextBuffer) else len(str2(value))
+
+
+    @BlockCategories.TEXT.blocks[11].on_evaluate()
+    def _(params: list, environment: Environment, block: Block):
+        return str2(environment[params[0]])
 
 # VARIABLE
 for ___ in range(1):
-    @BlockCategories.VARIABLE.blocks[0].on_trigger()
+    @BlockCategories.VARIABLE.blocks[0].on_evaluate(reads_variables=True)
     def _(params: list, environment: Environment, block: Block):
-        yield environment[params[0]]
+        return environment[params[0]]
 
     @BlockCategories.VARIABLE.blocks[1].on_trigger()
     def _(params: list, environment: Environment, block: Block):
-        environment[params[0]] = params[1]
+        environment[params[0]] = share(params[1])
         yield
 
     @BlockCategories.VARIABLE.blocks[2].on_trigger()
     def _(params: list, environment: Environment, block: Block):
-        try:
-            environment[params[0]] = float(environment[params[0]])
-        except ValueError:
-            pass
+        value = environment[params[0]]
+        if value.__class__ is not float and (number := parse_number(value)) is not None:
+            value = number
 
-        environment[params[0]] += params[1]
+        environment[params[0]] = value + params[1]
         yield
 
 
     @BlockCategories.VARIABLE.blocks[3].on_trigger()
     def _(params: list, environment: Environment, block: Block):
-        try:
-            environment[params[0]] = float(environment[params[0]])
-        except ValueError:
-            pass
+        value = environment[params[0]]
+        if value.__class__ is not float and (number := parse_number(value)) is not None:
+            value = number
+
+        environment[params[0]] = value - params[1]
+        yield
 
-        environment[params[0]] -= params[1]
+# LIST
+for ___ in range(1):
+    @BlockCategories.LIST.blocks[0].on_evaluate(pure=True)
+    def _(params: list, environment: Environment, block: Block):
+        require_numpy()
+        if params[2] == 0:
+            raise Exception("The step of a range can't be 0.")
+        # inclusive, like "numbers from 1 to 10"
+        count = max(math.floor((params[1] - params[0]) / params[2] + 1e-9) + 1, 0)
+        check_size(environment, count * 8)
+        return params[0] + np.arange(count) * params[2]
+
+    @BlockCategories.LIST.blocks[1].on_evaluate(pure=True)
+    def _(params: list, environment: Environment, block: Block):
+        require_numpy()
+        check_size(environment, max(int(params[0]), 0) * 8)
+        return np.full(max(int(params[0]), 0), params[1])
+
+    @BlockCategories.LIST.blocks[2].on_evaluate(pure=True)
+    def _(params: list, environment: Environment, block: Block):
+        return np.atleast_1d(to_array(params[0]))
+
+    @BlockCategories.LIST.blocks[3].on_evaluate(pure=True)
+    def _(params: list, environment: Environment, block: Block):
+        return np.add(to_array(params[0]), to_array(params[1]))
+
+    @BlockCategories.LIST.blocks[4].on_evaluate(pure=True)
+    def _(params: list, environment: Environment, block: Block):
+        return np.subtract(to_array(params[0]), to_array(params[1]))
+
+    @BlockCategories.LIST.blocks[5].on_evaluate(pure=True)
+    def _(params: list, environment: Environment, block: Block):
+        return np.multiply(to_array(params[0]), to_array(params[1]))
+
+    @BlockCategories.LIST.blocks[6].on_evaluate(pure=True)
+    def _(params: list, environment: Environment, block: Block):
+        divisor = to_array(params[1])
+        if np.any(divisor == 0):
+            raise ZeroDivisionError("division by zero")
+        return np.divide(to_array(params[0]), divisor)
+
+    @BlockCategories.LIST.blocks[7].on_evaluate(pure=True)
+    def _(params: list, environment: Environment, block: Block):
+        return float(np.sum(to_array(params[0])))
+
+    @BlockCategories.LIST.blocks[8].on_evaluate(pure=True)
+    def _(params: list, environment: Environment, block: Block):
+        return float(np.min(to_values(params[0], "smallest number")))
+
+    @BlockCategories.LIST.blocks[9].on_evaluate(pure=True)
+    def _(params: list, environment: Environment, block: Block):
+        return float(np.max(to_values(params[0], "largest number")))
+
+    @BlockCategories.LIST.blocks[10].on_evaluate(pure=True)
+    def _(params: list, environment: Environment, block: Block):
+        return float(np.mean(to_values(params[0], "average")))
+
+    @BlockCategories.LIST.blocks[11].on_evaluate(pure=True)
+    def _(params: list, environment: Environment, block: Block):
+        return np.sort(to_array(params[0]))
+
+    @BlockCategories.LIST.blocks[12].on_evaluate(pure=True)
+    def _(params: list, environment: Environment, block: Block):
+        return np.atleast_1d(to_array(params[2]))[max(int(params[0]) - 1, 0):int(params[1])]
+
+    @BlockCategories.LIST.blocks[13].on_evaluate(pure=True)
+    def _(params: list, environment: Environment, block: Block):
+        return float(np.atleast_1d(to_array(params[1]))[int(params[0] - 1)])
+
+    @BlockCategories.LIST.blocks[14].on_evaluate(pure=True)
+    def _(params: list, environment: Environment, block: Block):
+        return len(np.atleast_1d(to_array(params[0])))
+
+# PROCEDURE
+for ___ in range(1):
+    @BlockCategories.PROCEDURE.blocks[0].on_trigger()
+    def _(params: list, environment: Environment, block: Block):
+        yield  # the Scheduler runs the body when the procedure is called, never as a script
+
+    @BlockCategories.PROCEDURE.blocks[1].on_trigger()
+    def _(params: list, environment: Environment, block: Block):
+        yield Call(to_name(params[0]), params[1:], block.tail, keep_result=False)
+
+    @BlockCategories.PROCEDURE.blocks[2].on_suspend()
+    def _(params: list, environment: Environment, block: Block):
+        return (yield Call(to_name(params[0]), params[1:], block.tail))
+
+    @BlockCategories.PROCEDURE.blocks[3].on_trigger()
+    def _(params: list, environment: Environment, block: Block):
+        raise ProcedureReturn(params[0])
         yield
 
 ALL_CATEGORIES = [
@@ -447,7 +689,8 @@ ALL_CATEGORIES = [
     BlockCategories.BOOLEAN,
     BlockCategories.TEXT,
     BlockCategories.VARIABLE,
-    # BlockCategories.PROCEDURE
+    BlockCategories.LIST,
+    BlockCategories.PROCEDURE
 ]
 
 def get_all_blocks():
@@ -0,0 +1,251 @@
+from typing import Callable, Generator
+
+from blockly import *
+from profiler import Profiler
+from debugger import DebugThread
+from values import to_text, tag_literal
+
+__all__ = ["CompiledBlock", "CompiledStack", "compile_block", "compile_stack"]
+
+Evaluator = Callable[[Environment], object]
+
+COERCIONS: dict[CompT, Callable[[object], object]] = {
+    CompT.NUMBER_INPUT: float,
+    CompT.TEXT_INPUT: to_text
+}
+
+class CompiledBlock:
+    """
+    A block whose inputs were resolved before the run.
+    Looks like a Block to block implementations, so they can keep calling ``block.get_value``.
+    A block that ``suspends`` (e.g. one waiting for input, or containing one) has a generator function
+    as ``evaluate``, which yields while it waits and returns the value.
+    """
+    def __init__(self, block: Block):
+        self.block = block
+        self.definition = block.definition
+        self.values = block.values
+        self.execute: Callable[[Environment], Generator | None] = lambda environment: None
+        self.evaluate: Evaluator = lambda environment: None
+        self.suspends = False
+        self.waits = False  # one of the inputs suspends
+        self.tail = block.tail
+        self.getters: list[Evaluator] = []
+        self.waiters: list[Callable[[Environment], Generator] | None] = []
+
+    def get_value(self, index: int, environment: Environment) -> object:
+        return self.getters[index](environment)
+
+    def wait_value(self, index: int, environment: Environment):
+        waiter = self.waiters[index]
+        if waiter is None:
+            return self.getters[index](environment)
+        return (yield from waiter(environment))
+
+    def __repr__(self):
+        return f"CompiledBlock({self.block!r})"
+
+class CompiledStack:
+    """
+    Looks like a Stack to block implementations, so ``params[i].execute(environment)`` runs compiled code.
+    """
+    def __init__(self, blocks: list[CompiledBlock]):
+        self.blocks = blocks
+        self.runners = [block.execute for block in blocks]
+
+    def execute(self, environment: Environment):
+        for run in self.runners:
+            yield from run(environment)
+
+    def __repr__(self):
+        return f"CompiledStack({self.blocks!r})"
+
+def constant(value: object) -> Evaluator:
+    return lambda environment: value
+
+def failing_constant(value: object, coerce: Callable[[object], object]) -> Evaluator:
+    # keeps the error (e.g. float("abc")) at run time, where ``try`` blocks can catch it
+    return lambda environment: coerce(value)
+
+def cannot_wait(environment: Environment):
+    raise Exception("This block can't wait for input.")
+
+def dependencies(block: Block, environment: Environment) -> set[int] | None:
+    """
+    Slots a reporter tree reads, or None if its result can change without one of them changing (e.g. ``rand``).
+    """
+    definition = block.definition
+    if definition.evaluate is None or not (definition.pure or definition.reads_variables):
+        return None
+
+    slots = set()
+    for i, value in enumerate(block.values):
+        if isinstance(value, Block):
+            child = dependencies(value, environment)
+            if child is None:
+                return None
+            slots |= child
+        elif isinstance(value, Stack):
+            return None
+        elif definition.reads_variables and definition.input_id(i).type == CompT.VARIABLE_INPUT:
+            slots.add(environment.slot(value if value is not None else definition.input_id(i).default))
+    return slots
+
+def memoized(evaluate: Evaluator, slots: list[int]) -> Evaluator:
+    """
+    Reuses the last result while the versions of ``slots`` stay the same.
+    That is only right if a value can't change without its slot being written: the one mutable value,
+    a text buffer, is copied before an append once a second variable holds it (see ``text_buffer.share``).
+    """
+    cache = [None, None]  # versions, result
+
+    if len(slots) == 1:
+        slot = slots[0]
+        def memo(environment: Environment):
+            version = environment.versions[slot]
+            if cache[0] != version:
+                cache[1] = evaluate(environment)
+                cache[0] = version
+            return cache[1]
+    else:
+        def memo(environment: Environment):
+            versions = environment.versions
+            key = [versions[slot] for slot in slots]
+            if cache[0] != key:
+                cache[1] = evaluate(environment)
+                cache[0] = key
+            return cache[1]
+
+    return memo
+
+def compile_block(block: Block, environment: Environment, profiler: Profiler | None = None, memoize: bool = True, debugger: DebugThread | None = None) -> CompiledBlock:
+    """
+    Reporter trees that only depend on variables are cached at their root, keyed by the versions of those variables.
+    Single blocks aren't, looking the cache up would cost as much as evaluating them.
+    """
+    slots = None
+    if memoize and any(isinstance(value, Block) for value in block.values):
+        slots = dependencies(block, environment)
+    if slots is not None:
+        memoize = False  # the whole tree is cached here
+
+    compiled = CompiledBlock(block)
+    definition = block.definition
+
+    template = []
+    dynamic: list[tuple[int, Evaluator, Callable[[object], object] | None, bool]] = []
+    for i, value in enumerate(block.values):
+        component = definition.input_id(i)
+        coerce = COERCIONS.get(component.type)
+
+        if isinstance(value, Block):
+            child = compile_block(value, environment, profiler, memoize, debugger)
+            compiled.getters.append(cannot_wait if child.suspends else child.evaluate)
+            compiled.waiters.append(child.evaluate if child.suspends else None)
+            compiled.waits = compiled.waits or child.suspends
+            if i not in definition.lazy:
+                dynamic.append((i, child.evaluate, coerce, child.suspends))
+            template.append(None)
+            continue
+
+        if value is None:
+            value = component.default
+        if isinstance(value, Stack):
+            value = compile_stack(value, environment, profiler, debugger)
+        elif component.type == CompT.VARIABLE_INPUT:
+            value = environment.slot(value)
+        elif component.type == CompT.INPUT:
+            value = tag_literal(value)
+        compiled.getters.append(constant(value))
+        compiled.waiters.append(None)
+
+        if coerce is not None:
+            try:
+                value = coerce(value)
+            except Exception:
+                dynamic.append((i, failing_constant(value, coerce), None, False))
+                value = None
+        template.append(value)
+
+    if any(suspends for *_, suspends in dynamic) or definition.suspends:
+        execute, evaluate = compile_waiting(compiled, template, dynamic)
+    else:
+        execute, evaluate = compile_call(compiled, template, dynamic)
+
+    if slots:
+        evaluate = memoized(evaluate, sorted(slots))
+
+    if profiler is not None:
+        evaluate = (profiler.wrap_execute if compiled.suspends else profiler.wrap_evaluate)(block, evaluate)
+        execute = profiler.wrap_execute(block, execute)
+
+    if debugger is not None and definition.evaluate is None:
+        execute = debugger.wrap_execute(block, execute)
+
+    compiled.execute = execute
+    compiled.evaluate = evaluate
+    return compiled
+
+def compile_call(compiled: CompiledBlock, template: list, dynamic: list) -> tuple[Callable, Evaluator]:
+    definition = compiled.definition
+    impl = definition.evaluate or definition.execute
+
+    if dynamic:
+        def call(environment: Environment):
+            params = template.copy()
+            for i, evaluate, coerce, _ in dynamic:
+                value = evaluate(environment)
+                params[i] = value if coerce is None else coerce(value)
+            return impl(params, environment, compiled)
+    else:
+        def call(environment: Environment):
+            return impl(template, environment, compiled)
+
+    if definition.evaluate is not None:
+        def execute(environment: Environment):
+            yield call(environment)
+        return execute, call
+
+    def evaluate(environment: Environment):
+        return next(call(environment))
+    return call, evaluate
+
+def compile_waiting(compiled: CompiledBlock, template: list, dynamic: list) -> tuple[Callable, Callable]:
+    """
+    For blocks that wait themselves or have an input that does: inputs that wait are run with ``yield from``,
+    so the script is suspended, not the whole program. Reporters become suspending too.
+    """
+    definition = compiled.definition
+    impl = definition.evaluate or definition.execute
+    is_reporter = definition.block_type == BlockType.REPORTER
+
+    def run(environment: Environment):
+        params = template.copy()
+        for i, evaluate, coerce, suspends in dynamic:
+            value = (yield from evaluate(environment)) if suspends else evaluate(environment)
+            params[i] = value if coerce is None else coerce(value)
+
+        result = impl(params, environment, compiled)
+        if definition.evaluate is not None:
+            return result
+        if definition.suspends:
+            return (yield from result)
+        if is_reporter:
+            return next(result)
+        yield from result
+
+    if is_reporter:
+        compiled.suspends = True
+        return run, run
+
+    def evaluate(environment: Environment):
+        return next(run(environment))
+    return run, evaluate
+
+def compile_stack(stack: Stack, environment: Environment, profiler: Profiler | None = None, debugger: DebugThread | None = None) -> CompiledStack:
+    """
+    Compiles the stack for running in ``environment``. Variable names become the environment's slot indices.
+    With a profiler, every block is wrapped to record its executions; with a debugger, every statement checks
+    for breakpoints before it runs.
+    """
+    return CompiledStack([compile_block(block, environment, profiler, debugger=debugger) for block in stack.blocks])
@@ -0,0 +1,119 @@
+import json
+import sys
+import tempfile
+import zlib
+from typing import Iterable, Iterator
+
+MEMORY_LINES = 8192
+CHUNK_LINES = 4096
+
+class Console:
+    """
+    Console output that keeps only the newest lines in memory. Older lines are compressed and written
+    to a temporary file in chunks of ``chunk_lines``, so a program can print millions of lines
+    and still be scrolled and searched from the beginning, without its memory growing.
+    Works like the list of lines it replaces: ``append``, ``extend``, ``len``, indexing and slicing.
+    """
+    def __init__(self, memory_lines: int = MEMORY_LINES, chunk_lines: int = CHUNK_LINES):
+        self.memory_lines = memory_lines
+        self.chunk_lines = chunk_lines
+        self.recent: list[str] = []
+        self.chunks: list[tuple[int, int]] = []  # (offset, size) in the spill file
+        self.spill_file = None
+        self.cached_chunk: tuple[int, list[str]] = (-1, [])
+        self.version = 0  # changes whenever the lines do, for caching what is drawn of them
+
+    @property
+    def spilled(self) -> int:
+        return len(self.chunks) * self.chunk_lines
+
+    def append(self, line: str):
+        self.recent.append(line)
+        self.version += 1
+        if len(self.recent) >= self.memory_lines + self.chunk_lines:
+            self.spill()
+
+    def extend(self, lines: Iterable[str]):
+        self.recent.extend(lines)
+        self.version += 1
+        while len(self.recent) >= self.memory_lines + self.chunk_lines:
+            self.spill()
+
+    def spill(self):
+        if self.spill_file is None:
+            self.spill_file = tempfile.TemporaryFile()
+        data = zlib.compress(json.dumps(self.recent[:self.chunk_lines]).encode())
+        self.spill_file.seek(0, 2)
+        self.chunks.append((self.spill_file.tell(), len(data)))
+        self.spill_file.write(data)
+        del self.recent[:self.chunk_lines]
+
+    def chunk(self, index: int) -> list[str]:
+        if self.cached_chunk[0] != index:
+            offset, size = self.chunks[index]
+            self.spill_file.seek(offset)
+            self.cached_chunk = index, json.loads(zlib.decompress(self.spill_file.read(size)))
+        return self.cached_chunk[1]
+
+    def clear(self):
+        self.recent.clear()
+        self.chunks.clear()
+        self.cached_chunk = (-1, [])
+        self.version += 1
+        if self.spill_file is not None:
+            self.spill_file.close()
+            self.spill_file = None
+
+    def lines(self, start: int, stop: int) -> list[str]:
+        start, stop = max(start, 0), min(stop, len(self))
+        spilled = self.spilled
+        result = []
+        while start < min(stop, spilled):
+            index, skip = divmod(start, self.chunk_lines)
+            taken = self.chunk(index)[skip:skip + min(stop, spilled) - start]
+            result.extend(taken)
+            start += len(taken)
+        if stop > spilled:
+            result.extend(self.recent[start - spilled:stop - spilled])
+        return result
+
+    def search(self, text: str, start: int = 0) -> int | None:
+        """
+        Index of the first line at or after ``start`` that contains ``text``, or None.
+        """
+        for index in range(max(start, 0) // self.chunk_lines, len(self.chunks)):
+            first = index * self.chunk_lines
+            for i, line in enumerate(self.chunk(index)):
+                if first + i >= start and text in line:
+                    return first + i
+        spilled = self.spilled
+        for i in range(max(start - spilled, 0), len(self.recent)):
+            if text in self.recent[i]:
+                return spilled + i
+        return None
+
+    def __len__(self) -> int:
+        return self.spilled + len(self.recent)
+
+    def __getitem__(self, item: int | slice) -> str | list[str]:
+        if isinstance(item, slice):
+            start, stop, step = item.indices(len(self))
+            if step == 1:
+                return self.lines(start, stop)
+            return [self[i] for i in range(start, stop, step)]
+        if item < 0:
+            item += len(self)
+        if not 0 <= item < len(self):
+            raise IndexError("console line out of range")
+        return self.lines(item, item + 1)[0]
+
+    def __iter__(self) -> Iterator[str]:
+        for index in range(len(self.chunks)):
+            yield from self.chunk(index)
+        yield from self.recent
+
+    def __sizeof__(self) -> int:
+        return object.__sizeof__(self) + sys.getsizeof(self.recent) + sum(sys.getsizeof(line) for line in self.recent)
+
+    def __repr__(self):
+        return f"Console({len(self)} lines, {self.spilled} on disk)"
@@ -0,0 +1,117 @@
+"""
+Runs a project without opening a window, as fast as the interpreter goes.
+
+Usage::
+
+    python headless.py examples/fizz.pyb
+    python headless.py quiz.pyb < answers.txt
+
+"""
+import argparse
+import codecs
+import sys
+import time
+from typing import BinaryIO, TextIO
+
+from blockly import Environment, READ_BUFFER_SIZE
+from project import load_project
+from scheduler import Scheduler
+from quota import Quota, QuotaExceeded
+from profiler import Profiler
+
+OUTPUT_CHUNK = 256
+SLICE = 0.05
+
+def flush_output(environment: Environment, out: TextIO):
+    if environment.output:
+        out.write("\n".join(environment.output))
+        out.write("\n")
+        environment.output.clear()
+
+def read_input(environment: Environment, stdin: BinaryIO, decoder: codecs.IncrementalDecoder):
+    """
+    Reads whatever input is available, up to a buffer full, instead of one line per read.
+    """
+    data = stdin.read1(READ_BUFFER_SIZE)
+    if data:
+        environment.feed_input(decoder.decode(data))
+    else:
+        environment.feed_input(decoder.decode(b"", final=True))
+        environment.close_input()
+
+def run(path: str, out: TextIO = sys.stdout, verbose: bool = False, quota: Quota | None = None, profiler: Profiler | None = None, stdin: BinaryIO | None = None) -> int:
+    """
+    Input blocks read lines from ``stdin``, the process' standard input by default.
+    """
+    stacks, _ = load_project(path)
+    environment = Environment()
+    stdin = stdin if stdin is not None else sys.stdin.buffer
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    scheduler = Scheduler(stacks, environment, quota, profiler)
+    if not scheduler.scripts:
+        print(f"{path}: no \"when the program starts\" block.", file=sys.stderr)
+        return 2
+    if verbose:
+        print(f"Optimizer removed {scheduler.removed_blocks} block(s).", file=sys.stderr)
+
+    try:
+        while not scheduler.finished():
+            scheduler.run(SLICE)
+            if len(environment.output) >= OUTPUT_CHUNK or not scheduler.runnable:
+                flush_output(environment, out)
+                out.flush()
+            if environment.input_line is not None and not environment.input_lines and not environment.input_closed:
+                flush_output(environment, out)  # the question has to be out before waiting for the answer
+                out.flush()
+                read_input(environment, stdin, decoder)
+            if not scheduler.runnable and (wake_time := scheduler.next_wake()) is not None:
+                time.sleep(max(wake_time - time.perf_counter(), 0))
+    except RuntimeError:
+        pass  # quit
+    except QuotaExceeded as e:
+        flush_output(environment, out)
+        out.flush()
+        print(f"Program was stopped.\n{e}", file=sys.stderr)
+        return 3
+    except Exception as e:
+        flush_output(environment, out)
+        out.flush()
+        print(f"Program encountered an error.\n{e}", file=sys.stderr)
+        return 1
+
+    flush_output(environment, out)
+    out.flush()
+    if verbose:
+        print(f"{scheduler.steps} steps.", file=sys.stderr)
+    return 0
+
+def report(profiler: Profiler, csv_path: str | None):
+    print(profiler.format_table(), file=sys.stderr)
+    if csv_path is not None:
+        profiler.export_csv(csv_path)
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a PyBlocks project without the editor.")
+    parser.add_argument("project", help="path to a .pyb file")
+    parser.add_argument("-v", "--verbose", action="store_true", help="report what the optimizer did")
+    parser.add_argument("--max-steps", type=int, help="stop the program after this many steps")
+    parser.add_argument("--max-time", type=float, help="stop the program after this many seconds")
+    parser.add_argument("--max-output", type=int, help="stop the program after it printed this many lines")
+    parser.add_argument("--max-memory", type=int, help="stop the program once its variables take roughly this many bytes")
+    parser.add_argument("-i", "--input", metavar="PATH", help="read the program's input from a file instead of standard input")
+    parser.add_argument("--profile", action="store_true", help="print the hottest blocks when the program ends")
+    parser.add_argument("--profile-csv", metavar="PATH", help="also write every block's profile to a CSV file")
+    args = parser.parse_args()
+    quota = Quota(args.max_steps, args.max_time, args.max_output, args.max_memory)
+    profiler = Profiler() if args.profile or args.profile_csv else None
+    if args.input is not None:
+        with open(args.input, "rb") as stdin:
+            code = run(args.project, verbose=args.verbose, quota=quota, profiler=profiler, stdin=stdin)
+    else:
+        code = run(args.project, verbose=args.verbose, quota=quota, profiler=profiler)
+    if profiler is not None:
+        report(profiler, args.profile_csv)
+    sys.exit(code)
+
+if __name__ == "__main__":
+    main()
@@ -1,61 +1,131 @@
 import pygame as pg
-pg.init()
-
-from workbench import Workbench
-from constants import *
-
-sc = pg.display.set_mode(flags=pg.FULLSCREEN, vsync=False)
-pg.display.set_caption("PyBlocks")
-# sc = pg.display.set_mode((1600, 900))
-WIDTH, HEIGHT = sc.get_size()
-
-clock = pg.Clock()
-dt = clock.tick() / 1000
-
-FONT = pg.Font("assets/arial.ttf")
-
-workbench = Workbench((int(WIDTH * 0.75), HEIGHT), [])
-CONSOLE_START = int(WIDTH * 0.75)
-
-pg.key.set_repeat(500, 50)
-pg.time.set_timer(pg.USEREVENT, 100 // 6)
-
-console_x = 0
-y = 0
-char_size = MONO.render("I", True, (0, 0, 0)).get_size()
-MAX_LINES = HEIGHT // char_size[1]
-
-while True:
-    #try:
-        for ev in pg.event.get():
-            if ev.type == pg.QUIT:
-                exit()
-            if ev.type == pg.MOUSEWHEEL:
-                if pg.mouse.get_pos()[0] < CONSOLE_START:
-                    workbench.event(ev)
-                else:
-                    if pg.key.get_pressed()[pg.K_LSHIFT] or pg.key.get_pressed()[pg.K_RSHIFT]:
-                        console_x -= char_size[0] * ev.y
-                        console_x = max(console_x, 0)
+
+def main():
+    pg.init()
+
+    from workbench import Workbench
+    from constants import MONO
+    from metrics import METRICS
+    from modal import Prompt, Button
+
+    sc = pg.display.set_mode(flags=pg.FULLSCREEN, vsync=False)
+    pg.display.set_caption("PyBlocks")
+    # sc = pg.display.set_mode((1600, 900))
+    WIDTH, HEIGHT = sc.get_size()
+
+    clock = pg.Clock()
+    dt = clock.tick() / 1000
+
+    FONT = pg.Font("assets/arial.ttf")
+
+    workbench = Workbench((int(WIDTH * 0.75), HEIGHT), [])
+    CONSOLE_START = int(WIDTH * 0.75)
+
+    pg.key.set_repeat(500, 50)
+
+    console_x = 0
+    y = 0
+    char_size = MONO.render("I", True, (0, 0, 0)).get_size()
+    MAX_LINES = HEIGHT // char_size[1]
+
+    show_metrics = False
+    metrics_note = ""
+
+    console_key = None
+    console_surf = None
+    last_search = ""
+
+    def search_console(text: str, start: int):
+        nonlocal y, last_search
+        last_search = text
+        output = workbench.environment.output
+        found = output.search(text, start)
+        if found is None:
+            found = output.search(text)  # wrap around
+        if found is not None:
+            y = found
+
+    def search_prompt(modal: Prompt, button: Button):
+        workbench.current_modal = None
+        if button == Button.CONFIRM and modal.value:
+            search_console(modal.value, 0)
+
+    while True:
+        #try:
+            METRICS.begin_frame()
+            with METRICS.measure("event"):
+                for ev in pg.event.get():
+                    if ev.type == pg.QUIT:
+                        exit()
+                    if ev.type == pg.KEYDOWN and ev.key == pg.K_F3:
+                        show_metrics = not show_metrics
+                        continue
+                    if ev.type == pg.KEYDOWN and ev.key == pg.K_F4:
+                        METRICS.export_csv("metrics.csv")
+                        METRICS.export_json("metrics.json")
+                        metrics_note = "Exported to metrics.csv and metrics.json"
+                        continue
+                    ctrl = pg.key.get_pressed()[pg.K_LCTRL] or pg.key.get_pressed()[pg.K_RCTRL]
+                    if ev.type == pg.KEYDOWN and ctrl and ev.key == pg.K_f and workbench.current_modal is None:
+                        workbench.current_modal = Prompt((workbench.width // 2, workbench.height // 2), (workbench.width, workbench.height), "Search console", "Find the next console line containing:", [Button.CANCEL, Button.CONFIRM], search_prompt)
+                        continue
+                    if ev.type == pg.KEYDOWN and ctrl and ev.key == pg.K_g and last_search:
+                        search_console(last_search, y + 1)
+                        continue
+                    if ev.type == pg.MOUSEWHEEL:
+                        if pg.mouse.get_pos()[0] < CONSOLE_START:
+                            workbench.event(ev)
+                        else:
+                            if pg.key.get_pressed()[pg.K_LSHIFT] or pg.key.get_pressed()[pg.K_RSHIFT]:
+                                console_x -= char_size[0] * ev.y
+                                console_x = max(console_x, 0)
+                            else:
+                                y -= ev.y
+                            y = max(y, 0)
                     else:
-                        y -= ev.y
-                    y = max(y, 0)
-            else:
-                had_exec = workbench.executor
-                workbench.event(ev)
-                if had_exec is None and workbench.executor is not None:
-                    y = 0
-                    console_x = 0
-
-        sc.fill((0, 0, 0))
-        workbench.update(dt)
-
-        # print(len(workbench.environment.output), y, y+MAX_LINES)
-        sc.blit(MONO.render("\n".join(workbench.environment.output[y:y + MAX_LINES]), True, (255, 255, 255)), (CONSOLE_START + 10 - console_x, 10))
-        sc.blit(workbench.draw(), (0, 0))
-
-        pg.display.flip()
-        dt = clock.tick() / 1000
-
-    #except Exception as e:
-    #    print(e)
\ No newline at end of file
+                        had_exec = workbench.executor
+                        workbench.event(ev)
+                        if had_exec is None and workbench.executor is not None:
+                            y = 0
+                            console_x = 0
+
+            sc.fill((0, 0, 0))
+            with METRICS.measure("update"):
+                workbench.update(dt)
+
+            # print(len(workbench.environment.output), y, y+MAX_LINES)
+            with METRICS.measure("console"):
+                output = workbench.environment.output
+                prompt = workbench.environment.input_line
+                key = (id(output), output.version, y, prompt, workbench.console_input)
+                if key != console_key:
+                    # only visible lines are rendered, and only when they changed
+                    lines = output[y:y + MAX_LINES]
+                    if prompt is not None and len(lines) < MAX_LINES:
+                        lines.append(prompt + workbench.console_input + "_")
+                    console_surf = MONO.render("\n".join(lines), True, (255, 255, 255))
+                    console_key = key
+                    METRICS.count("surfaces")
+                sc.blit(console_surf, (CONSOLE_START + 10 - console_x, 10))
+            with METRICS.measure("draw"):
+                sc.blit(workbench.draw(), (0, 0))
+
+            if show_metrics:
+                lines = [f"{name}: {value:.1f}" for name, value in METRICS.summary().items()]
+                if metrics_note:
+                    lines.append(metrics_note)
+                hud = FONT.render("\n".join(lines) + "\n(F3 hide, F4 export)", True, (255, 255, 0), (0, 0, 0))
+                hud.set_alpha(200)
+                sc.blit(hud, (10, 10))
+
+            with METRICS.measure("flip"):
+                pg.display.flip()
+            METRICS.end_frame()
+            dt = clock.tick() / 1000
+
+        #except Exception as e:
+        #    print(e)
+
+if __name__ == "__main__":
+    # the program runs in a spawned process that imports this module again, it must not open a window
+    main()
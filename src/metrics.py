@@ -0,0 +1,117 @@
+import csv
+import json
+import time
+from collections import deque
+from typing import Callable
+
+HISTORY = 600
+
+class FrameRecord:
+    """
+    What one frame spent its time on (seconds per section) and what it did (counters).
+    Sections can be nested: ``execute`` and ``render`` run inside ``update``.
+    """
+    def __init__(self, index: int):
+        self.index = index
+        self.start = time.perf_counter()
+        self.duration = 0.0
+        self.sections: dict[str, float] = {}
+        self.counters: dict[str, int] = {}
+
+    def as_dict(self) -> dict:
+        return {"frame": self.index, "duration": self.duration, **self.sections, **self.counters}
+
+    def __repr__(self):
+        return f"FrameRecord({self.index}, {self.duration * 1000:.2f}ms, {self.sections!r}, {self.counters!r})"
+
+class Section:
+    def __init__(self, metrics: 'Metrics', name: str):
+        self.metrics = metrics
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        sections = self.metrics.current.sections
+        sections[self.name] = sections.get(self.name, 0.0) + time.perf_counter() - self.start
+
+class Metrics:
+    """
+    Per-frame timings and counters of the editor, kept for the last ``history`` frames.
+    Hooks are called with every finished FrameRecord, e.g. to log or to catch slow frames::
+
+        METRICS.add_hook(lambda frame: frame.duration > 1 / 30 and print(frame))
+
+    """
+    def __init__(self, history: int = HISTORY):
+        self.frames: deque[FrameRecord] = deque(maxlen=history)
+        self.hooks: list[Callable[[FrameRecord], None]] = []
+        self.frame_count = 0
+        self.current = FrameRecord(0)
+
+    def add_hook(self, hook: Callable[[FrameRecord], None]):
+        self.hooks.append(hook)
+
+    def remove_hook(self, hook: Callable[[FrameRecord], None]):
+        self.hooks.remove(hook)
+
+    def begin_frame(self):
+        self.frame_count += 1
+        self.current = FrameRecord(self.frame_count)
+
+    def end_frame(self):
+        frame = self.current
+        frame.duration = time.perf_counter() - frame.start
+        self.frames.append(frame)
+        for hook in self.hooks:
+            hook(frame)
+
+    def measure(self, name: str) -> Section:
+        """
+        ``with METRICS.measure("draw"):`` adds the time of the block to this frame's ``draw`` section.
+        """
+        return Section(self, name)
+
+    def count(self, name: str, amount: int = 1):
+        counters = self.current.counters
+        counters[name] = counters.get(name, 0) + amount
+
+    def summary(self) -> dict[str, float]:
+        """
+        Average milliseconds per frame of every section, frames per second, and counters per second.
+        """
+        if not self.frames:
+            return {}
+        elapsed = sum(frame.duration for frame in self.frames)
+        sections: dict[str, float] = {}
+        counters: dict[str, int] = {}
+        for frame in self.frames:
+            for name, spent in frame.sections.items():
+                sections[name] = sections.get(name, 0.0) + spent
+            for name, amount in frame.counters.items():
+                counters[name] = counters.get(name, 0) + amount
+
+        summary = {"fps": len(self.frames) / elapsed if elapsed else 0.0, "frame ms": elapsed / len(self.frames) * 1000}
+        for name, spent in sections.items():
+            summary[f"{name} ms"] = spent / len(self.frames) * 1000
+        for name, amount in counters.items():
+            summary[f"{name}/s"] = amount / elapsed if elapsed else 0.0
+        return summary
+
+    def export_json(self, path: str):
+        with open(path, "w") as file:
+            json.dump({"summary": self.summary(), "frames": [frame.as_dict() for frame in self.frames]}, file, indent=1)
+
+    def export_csv(self, path: str):
+        rows = [frame.as_dict() for frame in self.frames]
+        fields = ["frame", "duration"]
+        for row in rows:
+            fields.extend(name for name in row if name not in fields)
+        with open(path, "w", newline="") as file:
+            writer = csv.DictWriter(file, fields, restval=0)
+            writer.writeheader()
+            writer.writerows(rows)
+
+METRICS = Metrics()
@@ -0,0 +1,80 @@
+from blockly import *
+
+__all__ = ["optimize_stack", "count_blocks"]
+
+def count_blocks(value: Block | Stack | object) -> int:
+    if isinstance(value, Stack):
+        return sum(count_blocks(block) for block in value.blocks)
+    if isinstance(value, Block):
+        return 1 + sum(count_blocks(child) for child in value.values)
+    return 0
+
+def optimize_stack(stack: Stack, memory_limit: int | None = None) -> tuple[Stack, int]:
+    """
+    Folds reporters whose inputs are all literals, and drops ``if`` arms that can never run.
+    Works on a copy: returns the optimized stack and how many blocks were removed.
+    ``memory_limit`` is the run's, so a value too big to make is left to fail at run time instead of being made here.
+    """
+    environment = Environment()
+    environment.memory_limit = memory_limit
+    optimized = fold_stack(stack, environment)
+    return optimized, count_blocks(stack) - count_blocks(optimized)
+
+def fold_stack(stack: Stack, environment: Environment) -> Stack:
+    blocks = []
+    for block in stack.blocks:
+        folded = fold_statement(block, environment)
+        if isinstance(folded, Stack):
+            blocks.extend(folded.blocks)
+        else:
+            blocks.append(folded)
+    return Stack(blocks, stack.position)
+
+def fold_value(value: object, environment: Environment) -> object:
+    if isinstance(value, Stack):
+        return fold_stack(value, environment)
+    if not isinstance(value, Block):
+        return value
+
+    folded = Block(value.definition, [fold_value(child, environment) for child in value.values])
+    folded.origin = value.origin
+    if not folded.definition.pure or any(isinstance(child, Block) for child in folded.values):
+        return folded
+    try:
+        return folded.evaluate(environment)
+    except Exception:
+        return folded  # let it fail at run time (also over the memory limit), where try blocks can catch it
+
+def literal_condition(block: Block) -> bool | None:
+    """
+    Truthiness of the block's first input, or None if it is only known at run time.
+    Only plain values are decided here: a folded list has no truthiness, and fails when the block runs.
+    """
+    value = block.values[0]
+    if value is None:
+        value = block.definition.input_id(0).default
+    if not isinstance(value, (bool, int, float, str)):
+        return None
+    return bool(value)
+
+def fold_statement(block: Block, environment: Environment) -> Block | Stack:
+    """
+    Returns the folded block, or the stack that replaces it.
+    """
+    folded = Block(block.definition, [fold_value(value, environment) for value in block.values])
+    folded.origin = block.origin
+
+    match folded.definition.id:
+        case "if":
+            condition = literal_condition(folded)
+            if condition is not None:
+                return (folded.values[1] or Stack([])) if condition else Stack([])
+        case "if-else":
+            condition = literal_condition(folded)
+            if condition is not None:
+                return (folded.values[1] if condition else folded.values[2]) or Stack([])
+        case "while":
+            if literal_condition(folded) is False:
+                return Stack([])
+
+    return folded
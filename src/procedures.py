@@ -0,0 +1,99 @@
+from typing import Generator
+
+from blockly import *
+
+__all__ = ["DEFINE", "CALLS", "MAX_DEPTH", "ProcedureReturn", "Call", "Procedure", "Frame", "is_definition", "definition_name", "mark_tail_calls"]
+
+DEFINE = "define"
+CALLS = ("call", "call-value")
+MAX_DEPTH = 100_000
+
+class ProcedureReturn(Exception):
+    """
+    Raised by ``return``; ends the procedure that is running, with ``value`` as its result.
+    """
+    def __init__(self, value: object):
+        super().__init__(value)
+        self.value = value
+
+class Call:
+    """
+    What a call block yields to the Scheduler, which runs the procedure and sends its result back.
+    A ``tail`` call replaces the procedure that made it instead of running on top of it.
+    """
+    __slots__ = ("name", "args", "tail", "keep_result")
+
+    def __init__(self, name: str, args: list, tail: bool = False, keep_result: bool = True):
+        self.name = name
+        self.args = args
+        self.tail = tail
+        self.keep_result = keep_result
+
+    def __repr__(self):
+        return f"Call({self.name!r}, {self.args!r}, tail={self.tail})"
+
+class Procedure:
+    """
+    A ``define`` stack compiled for one run: the slots of its parameters and its body.
+    """
+    def __init__(self, name: str, parameters: list[int], body):
+        self.name = name
+        self.parameters = parameters
+        self.body = body
+
+    def __repr__(self):
+        return f"Procedure({self.name!r}, {self.parameters!r})"
+
+class Frame:
+    """
+    One running procedure: its generator, and the values its parameters hid (by slot), put back when it ends.
+    """
+    __slots__ = ("procedure", "executor", "saved", "keep_result")
+
+    def __init__(self, procedure: Procedure, executor: Generator, saved: dict[int, object], keep_result: bool):
+        self.procedure = procedure
+        self.executor = executor
+        self.saved = saved
+        self.keep_result = keep_result
+
+    def __repr__(self):
+        return f"Frame({self.procedure.name!r})"
+
+def is_definition(stack: Stack) -> bool:
+    return bool(stack.blocks) and stack.blocks[0].definition.id == DEFINE
+
+def definition_name(block: Block) -> str | None:
+    """
+    Name of the procedure a ``define`` block defines, or None if it is a block: calls can only find typed in names.
+    """
+    name = block.values[0] if block.values[0] is not None else block.definition.input_id(0).default
+    if isinstance(name, Block):
+        return None
+    return to_name(name)
+
+def to_name(value: object) -> str:
+    return str(value).strip()
+
+def mark_tail_calls(stack: Stack):
+    """
+    Flags the calls whose result is the result of the procedure, so they can replace it when they run:
+    a call that ends the body, or ``return`` of a call, also inside ``if`` arms at the end.
+    Only for copies of the workspace blocks (e.g. optimized ones), moving a block changes where it ends up.
+    """
+    if not stack.blocks:
+        return
+    block = stack.blocks[-1]
+    match block.definition.id:
+        case "call":
+            block.tail = True
+        case "return":
+            value = block.values[0]
+            if isinstance(value, Block) and value.definition.id == "call-value":
+                value.tail = True
+        case "if":
+            if isinstance(block.values[1], Stack):
+                mark_tail_calls(block.values[1])
+        case "if-else":
+            for arm in block.values[1:3]:
+                if isinstance(arm, Stack):
+                    mark_tail_calls(arm)
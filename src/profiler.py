@@ -0,0 +1,117 @@
+import csv
+import time
+from typing import Callable, Generator
+
+from blockly import *
+
+class BlockProfile:
+    def __init__(self, block: Block):
+        self.block = block
+        self.count = 0
+        self.time = 0.0
+
+    def __repr__(self):
+        return f"BlockProfile({self.block.definition!r}, count={self.count}, time={self.time:.6f})"
+
+class Profiler:
+    """
+    Execution counts and cumulative wall time per workspace block.
+    Only stacks compiled with a profiler are instrumented, so a run without one pays nothing.
+    ``time`` is inclusive: it contains the time of the blocks inside the block. The table is sorted by self time.
+    """
+    def __init__(self):
+        self.profiles: dict[int, BlockProfile] = {}
+
+    def profile(self, block: Block) -> BlockProfile:
+        origin = block.origin
+        profile = self.profiles.get(id(origin))
+        if profile is None:
+            profile = self.profiles[id(origin)] = BlockProfile(origin)
+        return profile
+
+    def get(self, block: Block) -> BlockProfile | None:
+        return self.profiles.get(id(block))
+
+    def clear(self):
+        self.profiles.clear()
+
+    def self_time(self, profile: BlockProfile) -> float:
+        """
+        Time spent in the block itself, without the blocks inside it.
+        """
+        inner = 0.0
+        for value in profile.block.values:
+            children = value.blocks if isinstance(value, Stack) else [value]
+            for child in children:
+                if isinstance(child, Block) and (child_profile := self.get(child)) is not None:
+                    inner += child_profile.time
+        return max(profile.time - inner, 0.0)
+
+    def heat(self) -> dict[int, float]:
+        """
+        Self time of every profiled block relative to the hottest one, keyed by ``id`` of the workspace block.
+        """
+        times = {key: self.self_time(profile) for key, profile in self.profiles.items()}
+        hottest = max(times.values(), default=0.0)
+        if hottest <= 0:
+            return {}
+        return {key: spent / hottest for key, spent in times.items()}
+
+    def table(self) -> list[BlockProfile]:
+        return sorted(self.profiles.values(), key=self.self_time, reverse=True)
+
+    def format_table(self, limit: int = 20) -> str:
+        lines = [f"{'self (s)':>10} {'total (s)':>10} {'count':>10}  block"]
+        for profile in self.table()[:limit]:
+            lines.append(f"{self.self_time(profile):>10.4f} {profile.time:>10.4f} {profile.count:>10}  {profile.block.definition!r}")
+        return "\n".join(lines)
+
+    def export_csv(self, path: str):
+        with open(path, "w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(["block", "id", "count", "self_time", "total_time", "average_time"])
+            for profile in self.table():
+                writer.writerow([repr(profile.block.definition), profile.block.definition.id, profile.count, self.self_time(profile), profile.time, profile.time / profile.count if profile.count else 0])
+
+    def wrap_evaluate(self, block: Block, evaluate: Callable[[Environment], object]) -> Callable[[Environment], object]:
+        profile = self.profile(block)
+        perf_counter = time.perf_counter
+
+        def profiled(environment: Environment):
+            start = perf_counter()
+            try:
+                return evaluate(environment)
+            finally:
+                profile.count += 1
+                profile.time += perf_counter() - start
+
+        return profiled
+
+    def wrap_execute(self, block: Block, execute: Callable[[Environment], Generator]) -> Callable[[Environment], Generator]:
+        profile = self.profile(block)
+        perf_counter = time.perf_counter
+
+        def profiled(environment: Environment):
+            profile.count += 1
+            start = perf_counter()
+            generator = execute(environment)
+            sent = thrown = None
+            try:
+                while True:
+                    try:
+                        value = generator.send(sent) if thrown is None else generator.throw(thrown)
+                    except StopIteration as stop:
+                        return stop.value
+                    finally:
+                        profile.time += perf_counter() - start
+                    try:
+                        sent, thrown = (yield value), None
+                    except GeneratorExit:
+                        raise
+                    except BaseException as e:
+                        sent, thrown = None, e  # e.g. the error of a procedure this block called
+                    start = perf_counter()
+            finally:
+                generator.close()
+
+        return profiled
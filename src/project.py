@@ -0,0 +1,15 @@
+import gzip
+import json
+
+from blockly import Stack
+from blocks import get_all_blocks
+
+def load_project(path: str) -> tuple[list[Stack], set[str]]:
+    with open(path, "rb") as file:
+        data = json.loads(gzip.decompress(file.read()).decode())
+    return [Stack.deserialize(get_all_blocks(), stack) for stack in data["stacks"]], set(data["globals"])
+
+def save_project(path: str, stacks: list[Stack], globals: set[str]):
+    sjson = {"stacks": [stack.serialize() for stack in stacks], "globals": tuple(globals)}
+    with open(path, "wb+") as file:
+        file.write(gzip.compress(json.dumps(sjson).encode()))
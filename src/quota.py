@@ -0,0 +1,53 @@
+import sys
+
+from blockly import Environment
+from console import Console
+
+class QuotaExceeded(Exception):
+    pass
+
+def estimate_memory(environment: Environment) -> int:
+    """
+    Rough size in bytes of what the program holds on to: its variables and its console output.
+    Console lines that were moved to disk don't count.
+    """
+    output = environment.output
+    output_size = sys.getsizeof(output) if isinstance(output, Console) else sum(sys.getsizeof(line) for line in output)
+    return sum(sys.getsizeof(value) for value in environment.slots) + output_size
+
+def check_size(environment: Environment, size: int):
+    """
+    Fails before a value of about ``size`` bytes is made, if that alone is over the memory limit.
+    """
+    limit = environment.memory_limit
+    if limit is not None and size > limit:
+        raise QuotaExceeded(f"Memory limit exceeded: a value of about {size} bytes was about to be made, the limit is {limit}.")
+
+class Quota:
+    """
+    Limits for a single run. ``None`` means no limit.
+    Memory is estimated from the program's variables every ``memory_interval`` steps, not measured.
+    Blocks that can build a big value in one step (``join``, ``replace``, ...) check its size against
+    ``max_memory`` before they build it, through ``check_size``.
+    """
+    def __init__(self, max_steps: int | None = None, max_time: float | None = None, max_output: int | None = None, max_memory: int | None = None, memory_interval: int = 4096):
+        self.max_steps = max_steps
+        self.max_time = max_time
+        self.max_output = max_output
+        self.max_memory = max_memory
+        self.memory_interval = memory_interval
+
+    def check(self, steps: int, elapsed: float, output_lines: int):
+        if self.max_steps is not None and steps > self.max_steps:
+            raise QuotaExceeded(f"Step limit exceeded: more than {self.max_steps} steps.")
+        if self.max_time is not None and elapsed > self.max_time:
+            raise QuotaExceeded(f"Time limit exceeded: ran for more than {self.max_time:g} seconds.")
+        if self.max_output is not None and output_lines > self.max_output:
+            raise QuotaExceeded(f"Output limit exceeded: more than {self.max_output} lines.")
+
+    def check_memory(self, environment: Environment):
+        if self.max_memory is not None and (used := estimate_memory(environment)) > self.max_memory:
+            raise QuotaExceeded(f"Memory limit exceeded: about {used} bytes in use, the limit is {self.max_memory}.")
+
+    def __repr__(self):
+        return f"Quota(max_steps={self.max_steps!r}, max_time={self.max_time!r}, max_output={self.max_output!r}, max_memory={self.max_memory!r})"
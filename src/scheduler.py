@@ -0,0 +1,295 @@
+import heapq
+import time
+from collections import deque
+from enum import Enum, auto
+from typing import Generator
+
+from blockly import *
+from compiler import compile_stack
+from optimizer import optimize_stack
+from procedures import *
+from text_buffer import share
+from quota import Quota
+from profiler import Profiler
+from debugger import Debugger
+
+QUANTUM = 32
+
+class ScriptState(Enum):
+    RUNNABLE = auto()
+    SLEEPING = auto()
+    DONE = auto()
+
+    def __repr__(self):
+        return self.name
+
+class Script:
+    def __init__(self, stack: Stack, executor: Generator):
+        self.stack = stack
+        self.executor = executor
+        self.frames: list[Frame] = []  # procedures it is in, innermost last
+        self.bindings: dict[int, Frame] = {}  # parameter slots the script's frames bind, to the outermost frame binding each
+        self.live: dict[int, object] = {}  # their values while another script runs
+        self.value = None  # sent to the script when it resumes, e.g. a procedure's result
+        self.error: Exception | None = None  # or raised in it, e.g. a procedure's error
+        self.state = ScriptState.RUNNABLE
+        self.wake_time = 0.0
+        self.steps = 0
+
+    def __lt__(self, other: 'Script') -> bool:
+        return self.wake_time < other.wake_time
+
+    def __repr__(self):
+        return f"Script({self.state!r}, steps={self.steps})"
+
+def script_stacks(stacks: list[Stack]) -> list[Stack]:
+    return [stack for stack in stacks if stack.blocks and stack.blocks[0].definition.block_type == BlockType.HAT and not is_definition(stack)]
+
+class Scheduler:
+    """
+    Runs every hat-rooted stack as a green thread, all sharing one environment.
+    Runnable scripts take turns from a queue, a few steps at a time. Sleeping scripts wait in a heap
+    ordered by wake time, so they cost nothing until they are due.
+    An optional quota is checked between quanta; going over it raises QuotaExceeded.
+    With a debugger, only the stacks that have breakpoints are compiled with debugging checks.
+
+    Procedure bodies are compiled once, up front. Calls are trampolined: a call block yields a ``Call``,
+    and the script's own list of frames runs the body, so recursion doesn't nest Python generators
+    and resuming a script costs the same at any depth. Tail calls replace the frame they are made from.
+    Parameters live in variable slots while their script runs; when another script gets its turn, they are
+    swapped out for the values they hid, so every script sees only its own arguments.
+    """
+    def __init__(self, stacks: list[Stack], environment: Environment, quota: Quota | None = None, profiler: Profiler | None = None, debugger: Debugger | None = None):
+        self.environment = environment
+        self.quota = quota
+        self.debugger = debugger
+        self.scripts: list[Script] = []
+        self.runnable: deque[Script] = deque()
+        self.sleeping: list[Script] = []
+        self.removed_blocks = 0
+        self.steps = 0
+        self.output_lines = 0
+        self.started = time.perf_counter()
+        self.next_memory_check = quota.memory_interval if quota is not None else 0
+        environment.memory_limit = quota.max_memory if quota is not None else None
+        self.procedures: dict[str, Procedure] = {}
+        self.active: Script | None = None  # the script whose parameters are in the slots
+
+        for stack in filter(is_definition, stacks):
+            # a later definition with the same name replaces an earlier one
+            if (procedure := self.compile_procedure(stack, profiler)) is not None:
+                self.procedures[procedure.name] = procedure
+
+        for stack in script_stacks(stacks):
+            optimized, removed = optimize_stack(stack, environment.memory_limit)
+            self.removed_blocks += removed
+            script = Script(stack, compile_stack(optimized, environment, profiler, self.debug_thread(stack)).execute(environment))
+            self.scripts.append(script)
+            self.runnable.append(script)
+
+    def debug_thread(self, stack: Stack):
+        debugger = self.debugger
+        return debugger.thread() if debugger is not None and debugger.instruments(stack) else None
+
+    def compile_procedure(self, stack: Stack, profiler: Profiler | None = None) -> Procedure | None:
+        """
+        None for a definition that can't be called, e.g. one whose name is a block.
+        """
+        hat = stack.blocks[0]
+        name = definition_name(hat)
+        if name is None:
+            return None
+        parameters = [(i, self.environment.slot(value)) for i, value in enumerate(hat.values[1:]) if value]
+        optimized, removed = optimize_stack(Stack(stack.blocks[1:], stack.position), self.environment.memory_limit)
+        self.removed_blocks += removed
+        mark_tail_calls(optimized)
+        return Procedure(name, parameters, compile_stack(optimized, self.environment, profiler, self.debug_thread(stack)))
+
+    def enter(self, script: Script, call: Call) -> Exception | None:
+        """
+        Starts the called procedure on top of the script's frames. Returns the error for the caller if it can't.
+        """
+        procedure = self.procedures.get(call.name)
+        if procedure is None:
+            return Exception(f"There is no procedure called \"{call.name}\".")
+        frames = script.frames
+        keep_result = call.keep_result
+        if call.tail and frames:
+            frame = frames.pop()
+            frame.executor.close()
+            self.restore(script, frame)
+            keep_result = keep_result and frame.keep_result
+        elif len(frames) >= MAX_DEPTH:
+            return Exception(f"Too many procedure calls inside each other (more than {MAX_DEPTH}).")
+
+        environment = self.environment
+        slots = environment.slots
+        frame = Frame(procedure, procedure.body.execute(environment), {}, keep_result)
+        for i, slot in procedure.parameters:
+            frame.saved.setdefault(slot, slots[slot])
+            environment[slot] = share(call.args[i])  # the argument may be another variable's buffer
+            script.bindings.setdefault(slot, frame)
+        frames.append(frame)
+        return None
+
+    def restore(self, script: Script, frame: Frame):
+        environment = self.environment
+        bindings = script.bindings
+        for slot, value in frame.saved.items():
+            environment[slot] = value
+            if bindings.get(slot) is frame:
+                del bindings[slot]
+
+    def leave(self, script: Script) -> Frame:
+        frame = script.frames.pop()
+        self.restore(script, frame)
+        return frame
+
+    def switch_to(self, script: Script):
+        """
+        Puts the parameters of ``script`` into their slots, after taking out those of the script that ran before.
+        """
+        environment = self.environment
+        slots = environment.slots
+        active = self.active
+        if active is not None:
+            for slot, frame in active.bindings.items():
+                active.live[slot] = slots[slot]
+                environment[slot] = frame.saved[slot]
+        for slot, frame in script.bindings.items():
+            frame.saved[slot] = slots[slot]  # the variable may have changed meanwhile
+            environment[slot] = script.live.pop(slot)
+        self.active = script
+
+    def current_executor(self, script: Script) -> Generator:
+        return script.frames[-1].executor if script.frames else script.executor
+
+    def finished(self) -> bool:
+        return not self.runnable and not self.sleeping
+
+    def send_input(self, line: str):
+        self.environment.feed_input(line + "\n")
+
+    def next_wake(self) -> float | None:
+        return self.sleeping[0].wake_time if self.sleeping else None
+
+    def stop(self):
+        for script in self.scripts:
+            while script.frames:
+                script.frames.pop().executor.close()
+            script.executor.close()
+            script.state = ScriptState.DONE
+        self.runnable.clear()
+        self.sleeping.clear()
+        self.environment.close()
+
+    def wake_sleepers(self, now: float):
+        while self.sleeping and self.sleeping[0].wake_time <= now:
+            script = heapq.heappop(self.sleeping)
+            script.state = ScriptState.RUNNABLE
+            self.runnable.append(script)
+
+    def run(self, budget: float):
+        """
+        Steps scripts until ``budget`` seconds are used up or no script can run this frame.
+        Errors (and quit) raised by a script stop the program and are passed on to the caller.
+        """
+        try:
+            self.run_scripts(budget)
+        except BaseException:
+            self.stop()
+            raise
+        if self.finished():
+            self.environment.close()
+
+    def check_quota(self, now: float):
+        self.quota.check(self.steps, now - self.started, self.output_lines)
+        if self.steps >= self.next_memory_check:
+            self.quota.check_memory(self.environment)
+            self.next_memory_check = self.steps + self.quota.memory_interval
+
+    def run_scripts(self, budget: float):
+        environment = self.environment
+        runnable = self.runnable
+        quota = self.quota
+        debugger = self.debugger
+        now = time.perf_counter()
+        deadline = now + budget
+        self.wake_sleepers(now)
+        if quota is not None:
+            self.check_quota(now)
+
+        parked = []  # gave the frame back without sleeping
+        while runnable and now < deadline:
+            script = runnable.popleft()
+            if script is not self.active:
+                self.switch_to(script)
+            frames = script.frames
+            executor = frames[-1].executor if frames else script.executor
+            value, error = script.value, script.error
+            output_before = len(environment.output)
+            steps = 0
+            try:
+                while steps < QUANTUM:
+                    steps += 1
+                    try:
+                        request = executor.send(value) if error is None else executor.throw(error)
+                    except StopIteration:
+                        if not frames:
+                            script.state = ScriptState.DONE
+                            break
+                        value, error = "", None  # the procedure ended without return
+                        self.leave(script)
+                        executor = self.current_executor(script)
+                        continue
+                    except ProcedureReturn as result:
+                        if not frames:
+                            script.state = ScriptState.DONE
+                            break
+                        frame = self.leave(script)
+                        value, error = (result.value if frame.keep_result else ""), None
+                        executor = self.current_executor(script)
+                        continue
+                    except RuntimeError:
+                        raise  # quit
+                    except Exception as e:
+                        if not frames:
+                            raise
+                        value, error = None, e  # for the caller's try blocks
+                        self.leave(script)
+                        executor = self.current_executor(script)
+                        continue
+
+                    value = error = None
+                    if request is not None:
+                        error = self.enter(script, request)
+                        if error is None:
+                            executor = frames[-1].executor
+                    if environment.yield_frame:
+                        break
+            finally:
+                script.value, script.error = value, error
+                script.steps += steps
+                self.steps += steps
+                self.output_lines += len(environment.output) - output_before
+
+            if script.state == ScriptState.RUNNABLE:
+                if environment.yield_frame:
+                    environment.yield_frame = False
+                    if environment.wake_time > now:
+                        script.state = ScriptState.SLEEPING
+                        script.wake_time = environment.wake_time
+                        heapq.heappush(self.sleeping, script)
+                    else:
+                        parked.append(script)
+                    environment.wake_time = 0.0
+                else:
+                    runnable.append(script)
+
+            now = time.perf_counter()
+            if quota is not None:
+                self.check_quota(now)
+            if debugger is not None and debugger.paused:
+                break
+
+        runnable.extend(parked)
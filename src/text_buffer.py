@@ -0,0 +1,44 @@
+import sys
+
+class TextBuffer:
+    """
+    Text that is built up piece by piece. Appending only stores the piece, so building a long text
+    in a loop is linear instead of copying everything on every ``join``.
+    The pieces are joined once, when the text is needed, and kept joined until the next append.
+    A buffer that more than one variable holds is ``shared``: appending to it must copy it first,
+    so that text behaves like every other value and changes only through the variable it was added to.
+    """
+    def __init__(self, text: str = ""):
+        self.chunks: list[str] = [text] if text else []
+        self.length = len(text)
+        self.shared = False
+
+    def append(self, text: str):
+        if text:
+            self.chunks.append(text)
+            self.length += len(text)
+
+    def copy(self) -> 'TextBuffer':
+        return TextBuffer(str(self))
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __str__(self) -> str:
+        if len(self.chunks) > 1:
+            self.chunks = ["".join(self.chunks)]
+        return self.chunks[0] if self.chunks else ""
+
+    def __sizeof__(self) -> int:
+        return object.__sizeof__(self) + sum(sys.getsizeof(chunk) for chunk in self.chunks)
+
+    def __repr__(self):
+        return f"TextBuffer({self.length} characters in {len(self.chunks)} pieces)"
+
+def share(value: object) -> object:
+    """
+    Marks a buffer that is about to be stored in another variable as shared. Other values pass through.
+    """
+    if value.__class__ is TextBuffer:
+        value.shared = True
+    return value
@@ -0,0 +1,84 @@
+import re
+from typing import Callable
+
+from text_buffer import TextBuffer
+
+__all__ = ["FORMATTERS", "NumberText", "parse_number", "is_number", "str2", "to_text", "tag_literal"]
+
+# the text ``float()`` accepts, minus digit separators, so telling numbers from text never needs a try/except
+NUMBER_PATTERN = re.compile(r"\s*[+-]?(?:(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?|inf|infinity|nan)\s*", re.IGNORECASE)
+
+class NumberText(str):
+    """
+    Typed-in text that reads as a number, with the number parsed once (see ``tag_literal``).
+    It is still text: stored, shown, iterated and tested for truth like any other.
+    """
+    def __new__(cls, text: str, number: float):
+        self = super().__new__(cls, text)
+        self.number = number
+        return self
+
+    def __getnewargs__(self):
+        return str(self), self.number
+
+    def __float__(self) -> float:
+        return self.number
+
+def parse_number(value: object) -> float | None:
+    """
+    The number a value stands for, or None if it isn't one. Values are tagged by their class:
+    floats are numbers, text is a number if it reads as one, anything else never is.
+    """
+    cls = value.__class__
+    if cls is float:
+        return value
+    if cls is NumberText:
+        return value.number
+    if cls is str:
+        return float(value) if NUMBER_PATTERN.fullmatch(value) else None
+    if cls is int or cls is bool:
+        return float(value)
+    return None
+
+def is_number(value: object) -> bool:
+    return parse_number(value) is not None
+
+def format_number(value: float) -> str:
+    return f"{value:g}"
+
+def format_text(value: str) -> str:
+    return f"{float(value):g}" if NUMBER_PATTERN.fullmatch(value) else value
+
+FORMATTERS: dict[type, Callable[[object], str]] = {
+    float: format_number,
+    int: format_number,
+    bool: str,  # True/False, not 1/0
+    str: format_text,
+    NumberText: lambda text: format_number(text.number),
+    TextBuffer: str
+}
+
+def str2(obj: object) -> str:
+    """
+    How a value looks to the user: numbers without a trailing ``.0``, text that reads as a number formatted like one.
+    Other modules can teach it new types through ``FORMATTERS``.
+    """
+    formatter = FORMATTERS.get(obj.__class__)
+    if formatter is not None:
+        return formatter(obj)
+    return format_text(str(obj))
+
+def to_text(value: object) -> str:
+    """
+    Coercion for text inputs: text is used as it is, everything else the way ``str2`` shows it.
+    """
+    return value if value.__class__ is str else str2(value)
+
+def tag_literal(value: object) -> object:
+    """
+    Parses typed-in text that reads as a number once, so the blocks comparing it don't parse it every time.
+    The result is a ``NumberText``, not a float: a value that gets stored stays the text that was typed.
+    """
+    if value.__class__ is str and (number := parse_number(value)) is not None:
+        return NumberText(value, number)
+    return value
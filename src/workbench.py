@@ -1,21 +1,30 @@
-from typing import Callable, Generator
+from typing import Callable
 import pygame as pg
 
 from blockly import *
-from blockly_render import render_stack, render_block, outline
+from blockly_render import render_stack, render_block, outline, block_positions, ZoomPyramid
 from constants import *
 import pytweening as tween
 
 from modal import Modal, Button, Prompt
 from tweenable import Tweenable
-from blocks import ALL_CATEGORIES, get_all_blocks
+from blocks import ALL_CATEGORIES
+from project import load_project, save_project
+from scheduler import Scheduler, script_stacks
+from worker import ProcessExecutor
+from quota import Quota, QuotaExceeded
+from profiler import Profiler
+from debugger import Debugger, StepMode
+from metrics import METRICS
+from console import Console
 from rect_collision import RectCollision
 from enum import Enum, auto
 
-import json
-import gzip
-
 SNAP_DISTANCE = 25
+FRAME_BUDGET = 1 / 250
+MAX_SPEED_FRAME_BUDGET = 1 / 60
+EDITOR_MAX_MEMORY = 512 << 20
+EDITOR_MAX_OUTPUT = 10_000_000
 
 class ConnectionType(Enum):
     BEFORE = auto()
@@ -39,6 +48,7 @@ class ContextMenuOption:
     RENAME_VARIABLE = "rename variable..."
     DELETE_VARIABLE = "delete variable..."
     VARIABLE = "variable..."
+    BREAKPOINT = "toggle breakpoint"
     EMPTY = ""
 
     def __init__(self, type: str, display_text: str = None):
@@ -52,6 +62,7 @@ class Workbench:
     def __init__(self, size: tuple[int, int], stacks: list[Stack]):
         self.stacks = stacks
         self.stacks_render: list[RectCollision[Stack]] = []
+        self.pyramids: dict[int, ZoomPyramid] = {}  # by id of the stack
         self.cursor: Stack | None = None
         self.cursor_render: pg.Surface | None = None
         self.cursor_offset: tuple[int, int] = (0, 0)
@@ -102,10 +113,28 @@ class Workbench:
         self.current_modal: Modal | None = None
 
         self.globals: set[str] = set()
-        self.environment = Environment()
-        self.executor: Generator | None = None
+        self.environment = self.new_environment()
+        self.executor: Scheduler | ProcessExecutor | None = None
+        self.max_speed = False
+        self.run_in_process = True
+        self.quota = Quota(max_output=EDITOR_MAX_OUTPUT, max_memory=EDITOR_MAX_MEMORY)  # time limit: CTRL-L
+        self.profiler: Profiler | None = None
+        self.debugger = Debugger()
+        self.console_input = ""  # what is typed for an input block, until ENTER
+
+        self.bottom_text = self.render_bottom_text()
+
+    def render_bottom_text(self) -> pg.Surface:
+        speed = "On" if self.max_speed else "Off"
+        profiling = "On" if self.profiler else "Off"
+        limit = f"{self.quota.max_time:g}s" if self.quota.max_time is not None else "None"
+        return FONT.render(f"Save (CTRL-S), Open (CTRL-O), Reset Zoom (CTRL-0), Run (CTRL-ENTER), Max Speed: {speed} (CTRL-M), Profiler: {profiling} (CTRL-P, export CTRL-E), Time Limit: {limit} (CTRL-L)", True, (255, 255, 255))
 
-        self.bottom_text = FONT.render("Save (CTRL-S), Open (CTRL-O), Reset Zoom (CTRL-0), Run (CTRL-ENTER)", True, (255, 255, 255))
+    @staticmethod
+    def new_environment() -> Environment:
+        environment = Environment()
+        environment.output = Console()
+        return environment
 
     def get_variables(self, stack: Stack) -> set[str]:
         return self.globals
@@ -114,6 +143,8 @@ class Workbench:
         self.context_menu = stack, block, stack_index, block_index
         self.context_menu_attach_reporter = is_value
         self.context_menu_options = [ContextMenuOption(ContextMenuOption.DELETE), ContextMenuOption(ContextMenuOption.DUPLICATE)]
+        if not is_value:
+            self.context_menu_options.append(ContextMenuOption(ContextMenuOption.BREAKPOINT))
         self.context_menu_click_var_select = clicked_variable_select
         if clicked_variable_select:
             self.context_menu_options = [ContextMenuOption(ContextMenuOption.CREATE_VARIABLE), ContextMenuOption(ContextMenuOption.RENAME_VARIABLE), ContextMenuOption(ContextMenuOption.DELETE_VARIABLE), ContextMenuOption(ContextMenuOption.EMPTY)]
@@ -148,10 +179,7 @@ class Workbench:
             block = Block(block_def, [None] * block_def.count_inputs())
             rendered = pg.transform.smoothscale_by(render_block(block), 0.75)
             self.palette_mask.blit(rendered, (10, y))
-            if block_def.id == "start" and len(list(filter(lambda s: s.blocks[0].definition.id == "start", self.stacks))) != 0:
-                pass
-            else:
-                self.category_blocks.append(RectCollision(rendered, block, (10 + self.width * 0.05, y, rendered.get_width(), rendered.get_height())))
+            self.category_blocks.append(RectCollision(rendered, block, (10 + self.width * 0.05, y, rendered.get_width(), rendered.get_height())))
             self.category_render_height = y
             y += rendered.get_height() + 25
 
@@ -256,10 +284,17 @@ class Workbench:
     def update(self, dt: float):
         self.held_keys = pg.key.get_pressed()
 
+        if self.executor and not self.debugger.paused:
+            with METRICS.measure("execute"):
+                self.execute_frame()
+
         if self.current_modal is not None:
             self.current_modal.update(dt)
             return
 
+        # checked before stepping, so the last step of a tween is drawn too
+        zooming = not self.zoom.ended()
+        moving = not (self.cam_x.ended() and self.cam_y.ended())
         self.cam_x.next(dt)
         self.cam_y.next(dt)
         self.zoom.next(dt)
@@ -268,12 +303,15 @@ class Workbench:
         if not self.category_scroll.ended():
             self.update_palette_draw()
 
-        if not self.zoom.ended():
-            for i in range(len(self.stacks)):
-                self.start_render_stack(i, False)
+        if zooming:
+            # nearest prepared zoom level while animating, exact once it stops
+            self.start_render_stack(-1, False, self.zoom.ended())
+        elif moving:
+            self.place_stacks()
 
         if self.cursor:
-            self.cursor_render = render_stack(self.cursor)
+            with METRICS.measure("render"):
+                self.cursor_render = render_stack(self.cursor)
 
         self.connection_candidate = None
         for i, stack in enumerate(self.stacks):
@@ -398,20 +436,32 @@ class Workbench:
                 self.start_render_stack(stack_index)
                 return True
 
-    def start_render_stack(self, stack_index: int, complete_render: bool = True):
+    def start_render_stack(self, stack_index: int, complete_render: bool = True, exact: bool = True):
+        """
+        Renders the stack at ``stack_index`` again, or every stack for -1. The other stacks keep their surfaces,
+        and within the stack only the blocks that changed and the blocks around them are painted, the rest
+        comes from the render cache.
+        """
         if stack_index > len(self.stacks) - 1:
             return
-        for i in range(len(self.stacks)):
-            self.stacks_render[i] = self.render_stack(self.stacks[i], i, complete_render)[0]
+        with METRICS.measure("render"):
+            for i in (range(len(self.stacks)) if stack_index < 0 else (stack_index,)):
+                self.stacks_render[i] = self.render_stack(self.stacks[i], i, complete_render, exact)[0]
+
+    def place_stacks(self):
+        """
+        Moves the click areas of the stacks to where the camera shows them, without rendering anything.
+        """
+        for stack_render in self.stacks_render:
+            stack_render.rect.topleft = self.world_to_view(stack_render.obj.position)
 
     @staticmethod
     def delete_sub_stack(edit_value: tuple[Block, int, int]):
         edit_value[0].values[edit_value[1]] = None
 
     def remove_stack(self, stack_index: int):
-        self.stacks.pop(stack_index)
+        self.pyramids.pop(id(self.stacks.pop(stack_index)), None)
         self.stacks_render.pop(stack_index)
-        self.start_render_stack(-1)
 
     def do_context_action(self):
         action = self.context_menu_options[self.selected_context_menu_item].type
@@ -443,6 +493,9 @@ class Workbench:
             self.excuse_next_mouse_down = True
             self.cursor_offset = (self.context_menu_rect.x - origin[0]) / self.zoom.get_value(), (self.context_menu_rect.y - origin[1]) / self.zoom.get_value()
 
+        elif action == ContextMenuOption.BREAKPOINT:
+            self.debugger.toggle_breakpoint(self.context_menu[1])
+
         elif action == ContextMenuOption.VARIABLE:
             var_name = self.context_menu_options[self.selected_context_menu_item].value()
             edit_value = self.context_menu[3]
@@ -515,10 +568,7 @@ class Workbench:
             self.current_modal.event(ev)
             return
 
-        if ev.type == pg.USEREVENT:
-            if self.executor:
-                self.execute_step()
-        elif ev.type == pg.MOUSEBUTTONDOWN:
+        if ev.type == pg.MOUSEBUTTONDOWN:
             if self.excuse_next_mouse_down:
                 self.excuse_next_mouse_down = False
                 return
@@ -539,16 +589,12 @@ class Workbench:
                         actual_i = len(self.stacks_render) - 1 - i
                         do_break = self.click_stack(stack, actual_i, lambda: self.remove_stack(actual_i))
                         if do_break: break
-                    else:
-                        self.start_render_stack(-1)
 
                 elif ev.button == 3:
                     for i, stack in enumerate(reversed(self.stacks_render)):
                         actual_i = len(self.stacks_render) - 1 - i
                         do_break = self.right_click_stack(stack, actual_i)
                         if do_break: break
-                    else:
-                        self.start_render_stack(-1)
 
             else:
                 if ev.button == 1:
@@ -602,13 +648,14 @@ class Workbench:
                         self.cursor.position = self.view_to_world(self.get_cursor())
                         self.stacks.append(self.cursor)
                         self.stacks_render.append(None)
-                        self.start_render_stack(-1)
+                        self.start_render_stack(len(self.stacks) - 1)
 
                 self.cursor = None
 
         elif ev.type == pg.MOUSEMOTION and self.panning:
             self.cam_x.reset_to(self.cam_x.get_value() - ev.rel[0] / self.zoom.get_value())
             self.cam_y.reset_to(self.cam_y.get_value() - ev.rel[1] / self.zoom.get_value())
+            self.place_stacks()
 
         elif ev.type == pg.MOUSEWHEEL:
             if not self.panning:
@@ -653,58 +700,136 @@ class Workbench:
                         self.current_modal = Prompt((self.width // 2, self.height // 2), (self.width, self.height), "Open project", "This will erase everything! Please enter the file to open from:", [Button.CANCEL, Button.CONFIRM], self.open)
                     elif ev.key == pg.K_0:
                         self.zoom.new_target(1)
+                    elif ev.key == pg.K_m:
+                        self.max_speed = not self.max_speed
+                        self.bottom_text = self.render_bottom_text()
+                    elif ev.key == pg.K_p:
+                        self.profiler = None if self.profiler else Profiler()
+                        self.bottom_text = self.render_bottom_text()
+                    elif ev.key == pg.K_l:
+                        self.current_modal = Prompt((self.width // 2, self.height // 2), (self.width, self.height), "Time limit", "Stop programs after how many seconds? Leave empty for no limit:", [Button.CANCEL, Button.CONFIRM], self.set_time_limit)
+                    elif ev.key == pg.K_e and self.profiler:
+                        self.current_modal = Prompt((self.width // 2, self.height // 2), (self.width, self.height), "Export profile", "Please enter the CSV file to export the hot blocks to:", [Button.CANCEL, Button.CONFIRM], self.export_profile)
                     elif ev.key == pg.K_RETURN:
                         if self.executor:
+                            self.executor.stop()
                             self.executor = None
+                            self.debugger.reset()
+                            self.console_input = ""
                             self.environment.output.extend(["", "Program stopped."])
-                        elif len(list(filter(lambda s: s.blocks[0].definition.id == "start", self.stacks))) != 0:
-                            self.environment = Environment()
-                            executing_stack: Stack = next(filter(lambda s: s.blocks[0].definition.id == "start", self.stacks))
-                            self.executor = executing_stack.execute(self.environment)
+                        elif script_stacks(self.stacks):
+                            self.environment = self.new_environment()
+                            self.debugger.reset()
+                            if self.profiler or self.debugger.breakpoints:
+                                # the profiler and the debugger have to see the blocks run, so they can't be in another process
+                                if self.profiler:
+                                    self.profiler.clear()
+                                self.executor = Scheduler(self.stacks, self.environment, self.quota, self.profiler, self.debugger)
+                            elif self.run_in_process:
+                                self.executor = ProcessExecutor(self.stacks, self.environment, self.quota)
+                            else:
+                                self.executor = Scheduler(self.stacks, self.environment, self.quota, debugger=self.debugger)
+                elif isinstance(self.executor, Scheduler) and ev.key in (pg.K_F5, pg.K_F10, pg.K_F11):
+                    self.debug_key(ev.key)
+                elif self.executor and self.environment.input_line is not None:
+                    self.type_input(ev)
 
-    def execute_step(self):
+    def type_input(self, ev: pg.Event):
+        """
+        Typing while an input block waits goes to the console; ENTER sends the line to the program.
+        """
+        if ev.key == pg.K_RETURN:
+            self.environment.output.append(self.environment.input_line + self.console_input)
+            self.executor.send_input(self.console_input)
+            self.console_input = ""
+        elif ev.key == pg.K_BACKSPACE:
+            self.console_input = self.console_input[:-1]
+        elif ev.unicode.isprintable():
+            self.console_input += ev.unicode
+
+    def debug_key(self, key: int):
+        """
+        F5 pauses or continues, F10 steps over, F11 steps into and SHIFT-F11 steps out.
+        """
+        if key == pg.K_F5:
+            if self.debugger.paused:
+                self.debugger.resume()
+            else:
+                self.debugger.pause()
+        elif not self.debugger.paused:
+            return
+        elif key == pg.K_F10:
+            self.debugger.resume(StepMode.OVER)
+        elif self.held_keys[pg.K_LSHIFT] or self.held_keys[pg.K_RSHIFT]:
+            self.debugger.resume(StepMode.OUT)
+        else:
+            self.debugger.resume(StepMode.INTO)
+
+    def execute_frame(self):
+        """
+        Runs the scripts until the frame budget is used up, or every script gave the frame back (sleep, input).
+        """
+        steps_before = self.executor.steps
         try:
-            next(self.executor)
-        except StopIteration:
-            self.environment.output.extend(["", "Program finished."])
-            self.executor = None
+            self.executor.run(MAX_SPEED_FRAME_BUDGET if self.max_speed else FRAME_BUDGET)
         except RuntimeError:
             self.environment.output.extend(["", "Program finished."])
             self.executor = None
+        except QuotaExceeded as e:
+            self.environment.output.extend(["", "Program was stopped.", str(e)])
+            self.executor = None
         except Exception as e:
             self.environment.output.extend(["", "Program encountered an error.", str(e)])
             self.executor = None
+        else:
+            METRICS.count("steps", self.executor.steps - steps_before)
+            if self.executor.finished():
+                self.environment.output.extend(["", "Program finished."])
+                self.executor = None
 
     def save(self, modal: Prompt, button: Button):
         self.current_modal = None
         if button == Button.CONFIRM:
             path = modal.value
-            sjson = {"stacks": [stack.serialize() for stack in self.stacks], "globals": tuple(self.globals)}
-            json_data = json.dumps(sjson)
-            write = gzip.compress(json_data.encode())
             try:
-                with open(path, "wb+") as file:
-                    file.write(write)
+                save_project(path, self.stacks, self.globals)
                 self.current_modal = Modal((self.width // 2, self.height // 2), (self.width, self.height), "Saved!", f"The project is saved to\n{path}", [Button.OK], self.close_modal)
             except Exception:
                 self.current_modal = Modal((self.width // 2, self.height // 2), (self.width, self.height), "An Error Occurred!", "Please make sure the path exists and it's typed correctly!", [Button.OK], self.close_modal)
 
-    def open(self, modal: Prompt, button: Button):
+    def set_time_limit(self, modal: Prompt, button: Button):
+        self.current_modal = None
+        if button == Button.CONFIRM:
+            try:
+                self.quota.max_time = float(modal.value) if modal.value.strip() else None
+            except ValueError:
+                self.current_modal = Modal((self.width // 2, self.height // 2), (self.width, self.height), "An Error Occurred!", "The time limit has to be a number of seconds.", [Button.OK], self.close_modal)
+            self.bottom_text = self.render_bottom_text()
+
+    def export_profile(self, modal: Prompt, button: Button):
         self.current_modal = None
         if button == Button.CONFIRM:
             path = modal.value
             try:
-                with open(path, "rb+") as file:
-                    data = json.loads(gzip.decompress(file.read()).decode())
-                    self.stacks = []
-                    self.stacks_render = []
+                self.profiler.export_csv(path)
+                self.current_modal = Modal((self.width // 2, self.height // 2), (self.width, self.height), "Exported!", f"The profile is saved to\n{path}", [Button.OK], self.close_modal)
+            except Exception:
+                self.current_modal = Modal((self.width // 2, self.height // 2), (self.width, self.height), "An Error Occurred!", "Please make sure the path exists and it's typed correctly!", [Button.OK], self.close_modal)
 
-                    for i, stack in enumerate(data["stacks"]):
-                        self.stacks.append(Stack.deserialize(get_all_blocks(), stack))
-                        self.stacks_render.append(None)
-                        self.start_render_stack(i)
+    def open(self, modal: Prompt, button: Button):
+        self.current_modal = None
+        if button == Button.CONFIRM:
+            path = modal.value
+            try:
+                stacks, self.globals = load_project(path)
+                self.stacks = []
+                self.stacks_render = []
+                self.pyramids.clear()
 
-                    self.globals = set(data["globals"])
+                for i, stack in enumerate(stacks):
+                    self.stacks.append(stack)
+                    self.stacks_render.append(None)
+                    self.start_render_stack(i)
 
             except Exception:
                 self.current_modal = Modal((self.width // 3, self.height // 2), (self.width, self.height), "An Error Occurred!", "Please make sure the path exists and it's typed correctly!", [Button.OK], self.close_modal)
@@ -718,16 +843,54 @@ class Workbench:
     def view_to_world(self, coord: tuple[number, number]) -> tuple[float, float]:
         return (coord[0] - self.width / 2) / self.zoom.get_value() + self.cam_x.get_value(), (coord[1] - self.height / 2) / self.zoom.get_value() + self.cam_y.get_value()
 
-    def render_stack(self, stack: Stack, stack_index: int = 0, complete_render: bool = True) -> tuple[RectCollision[Stack], pg.Surface]:
+    def render_stack(self, stack: Stack, stack_index: int = 0, complete_render: bool = True, exact: bool = True) -> tuple[RectCollision[Stack], pg.Surface]:
         if complete_render:
-            prerender = render_stack(stack)
+            pyramid = ZoomPyramid(stack, render_stack(stack))
+            if stack_index < len(self.stacks) and self.stacks[stack_index] is stack:
+                self.pyramids[id(stack)] = pyramid  # not for the statement inputs rendered to find clicks in them
+            METRICS.count("render cache misses")
         else:
-            prerender = self.stacks_render[stack_index].orig_surf
+            pyramid = self.pyramids[id(stack)]
+            METRICS.count("render cache hits")
 
-        surf = pg.transform.scale_by(prerender, self.zoom.get_value())
+        prerender = pyramid.surf
+        surf = pyramid.get(self.zoom.get_value(), exact)
         x, y = self.world_to_view(stack.position)
         return RectCollision(surf, stack, (x, y, surf.get_width(), surf.get_height()), prerender), prerender
 
+    def draw_heat(self, heat: dict[int, float]):
+        """
+        Tints every block by how hot it ran.
+        """
+        zoom = self.zoom.get_value()
+        overlay = pg.Surface(self.surf.get_size(), pg.SRCALPHA)
+        for stack in self.stacks:
+            for block, x, y in block_positions(stack, *stack.position):
+                if (hotness := heat.get(id(block))) is not None and hotness > 0:
+                    color = (255, int(200 * (1 - hotness)), 0, int(40 + 120 * hotness))
+                    pg.draw.rect(overlay, color, (self.world_to_view((x, y)), (block.rect[2] * zoom, block.rect[3] * zoom)))
+        self.surf.blit(overlay, (0, 0))
+
+    def draw_debugger(self):
+        """
+        Breakpoint markers, the block the program is paused at and, while paused, the variables.
+        """
+        zoom = self.zoom.get_value()
+        debugger = self.debugger
+        for stack in self.stacks:
+            for block, x, y in block_positions(stack, *stack.position):
+                view_x, view_y = self.world_to_view((x, y))
+                if block is debugger.current:
+                    pg.draw.rect(self.surf, (255, 255, 0), (view_x, view_y, block.rect[2] * zoom, block.rect[3] * zoom), LINE_WIDTH * 2)
+                if debugger.has_breakpoint(block):
+                    pg.draw.circle(self.surf, (220, 30, 30), (view_x, view_y + DEFAULT_PADDING * 2 * zoom), DEFAULT_PADDING * zoom)
+
+        if debugger.paused and self.executor:
+            lines = ["Paused: F5 continue, F10 step over, F11 step into, SHIFT-F11 step out", ""]
+            lines.extend(f"{name} = {value!r}" for name, value in self.environment.globals.items())
+            watch = FONT.render("\n".join(lines), True, (255, 255, 255), (30, 30, 30))
+            self.surf.blit(watch, (self.width - watch.get_width() - 10, 10))
+
     def get_cursor(self) -> tuple[float, float]:
         """
         :return: Top left of the cursor block in view position
@@ -740,6 +903,11 @@ class Workbench:
         for i, stack in enumerate(self.stacks_render):
             self.surf.blit(stack.surf, self.world_to_view(stack.obj.position))
 
+        if self.profiler and (heat := self.profiler.heat()):
+            self.draw_heat(heat)
+        if self.debugger.breakpoints or self.debugger.paused:
+            self.draw_debugger()
+
         self.surf.blit(self.palette_mask, (self.width * 0.05, 0))
         self.surf.blit(self.category_surf, (0, 0))
 
@@ -0,0 +1,153 @@
+import multiprocessing as mp
+import queue
+import threading
+import time
+
+from blockly import *
+from blocks import get_all_blocks
+from scheduler import Scheduler
+from quota import Quota, QuotaExceeded
+
+SLICE = 0.02
+OUTPUT_QUEUE_SIZE = 64
+STOP_GRACE = 0.25
+WATCHDOG_GRACE = 1
+MAX_BANKED_TIME = 0.05  # run time the worker may catch up on after it was waiting
+IDLE_WAIT = 0.001
+
+def run_worker(stacks_json: list[dict], output: mp.Queue, stop: mp.Event, inputs: mp.Queue, granted: mp.Value, quota: Quota | None = None):
+    """
+    Entry point of the worker process. Output goes back in batches of lines, ``("output", lines, steps)``,
+    followed by one ``("finished",)``, ``("error", message)`` or ``("quota", message)``.
+    ``("prompt", text)`` tells that an input block started or stopped (``None``) waiting; lines typed
+    in the editor come in through ``inputs``.
+    ``granted`` is the run time in seconds the editor has handed out so far, one frame budget per frame,
+    so the program runs as fast as it would in the editor's process, max speed or not.
+    """
+    environment = Environment()
+    scheduler = Scheduler([Stack.deserialize(get_all_blocks(), stack) for stack in stacks_json], environment, quota)
+    result = ("finished",)
+    reported_steps = 0
+    reported_prompt = None
+    used = 0.0
+    try:
+        while not scheduler.finished() and not stop.is_set():
+            try:
+                # while a script waits for input, wait for it here instead of spinning
+                waiting = environment.input_line is not None and not environment.input_lines
+                environment.feed_input(inputs.get(timeout=SLICE) if waiting else inputs.get_nowait())
+            except queue.Empty:
+                pass
+
+            available = granted.value - used
+            if available > MAX_BANKED_TIME:
+                used += available - MAX_BANKED_TIME
+                available = MAX_BANKED_TIME
+            if available > 0:
+                start = time.perf_counter()
+                scheduler.run(min(available, SLICE))
+                used += time.perf_counter() - start
+            else:
+                time.sleep(IDLE_WAIT)
+            # the same question asked again is a new prompt
+            prompt = (environment.input_line, environment.input_count) if environment.input_line is not None else None
+            if prompt != reported_prompt:
+                reported_prompt = prompt
+                output.put(("prompt", environment.input_line))
+            if environment.output or scheduler.steps != reported_steps:
+                output.put(("output", environment.output, scheduler.steps))
+                environment.output = []
+                reported_steps = scheduler.steps
+            if not scheduler.runnable and (wake_time := scheduler.next_wake()) is not None:
+                time.sleep(min(max(wake_time - time.perf_counter(), 0), SLICE))
+    except RuntimeError:
+        pass  # quit
+    except QuotaExceeded as e:
+        result = ("quota", str(e))
+    except Exception as e:
+        result = ("error", str(e))
+    finally:
+        scheduler.stop()
+
+    if environment.output:
+        output.put(("output", environment.output, scheduler.steps))
+    output.put(result)
+
+class ProcessExecutor:
+    """
+    Runs the program in another process, so nothing it does can hold up the editor.
+    Has the same ``run``/``finished``/``stop`` interface as the Scheduler.
+    The worker enforces the quota itself; if it is stuck inside one long block past the time limit,
+    the watchdog here kills it.
+    """
+    def __init__(self, stacks: list[Stack], environment: Environment, quota: Quota | None = None):
+        context = mp.get_context("spawn")
+        self.environment = environment
+        self.output = context.Queue(OUTPUT_QUEUE_SIZE)
+        self.inputs = context.Queue()
+        self.stop_event = context.Event()
+        self.granted = context.Value("d", 0.0)
+        self.process = context.Process(target=run_worker, args=([stack.serialize() for stack in stacks], self.output, self.stop_event, self.inputs, self.granted, quota), daemon=True)
+        self.process.start()
+        self.done = False
+        self.steps = 0
+        self.watchdog_deadline = None
+        if quota is not None and quota.max_time is not None:
+            self.watchdog_deadline = time.perf_counter() + quota.max_time + WATCHDOG_GRACE
+
+    def finished(self) -> bool:
+        return self.done
+
+    def send_input(self, line: str):
+        self.inputs.put(line + "\n")
+        self.environment.input_line = None  # until the worker asks again
+
+    def run(self, budget: float):
+        """
+        Lets the worker run for another ``budget`` seconds and moves its output into the environment.
+        Raises the program's error once it ended with one.
+        """
+        with self.granted.get_lock():
+            self.granted.value += budget
+        deadline = time.perf_counter() + budget
+        while time.perf_counter() < deadline:
+            try:
+                message = self.output.get_nowait()
+            except queue.Empty:
+                break
+
+            if message[0] == "output":
+                self.environment.output.extend(message[1])
+                self.steps = message[2]
+            elif message[0] == "prompt":
+                self.environment.input_line = message[1]
+            else:
+                self.done = True
+                self.process.join()
+                if message[0] == "error":
+                    raise Exception(message[1])
+                if message[0] == "quota":
+                    raise QuotaExceeded(message[1])
+                return
+
+        if self.watchdog_deadline is not None and time.perf_counter() > self.watchdog_deadline:
+            self.done = True
+            self.process.terminate()
+            raise QuotaExceeded("Time limit exceeded: the program was stuck in a single block and had to be killed.")
+
+        if not self.process.is_alive() and self.output.empty():
+            self.done = True
+            raise Exception(f"The program's process exited unexpectedly (exit code {self.process.exitcode}).")
+
+    def stop(self):
+        """
+        Asks the worker to stop, and kills it if it doesn't within a moment. Doesn't wait for either.
+        """
+        self.done = True
+        self.stop_event.set()
+        threading.Thread(target=self.reap, daemon=True).start()
+
+    def reap(self):
+        self.process.join(STOP_GRACE)
+        if self.process.is_alive():
+            self.process.terminate()